@@ -60,6 +60,11 @@ def plugin_loaded():
         message_dialog(message)
 
 def plugin_unloaded():
+    from .libraries.mdns.mdns import mdns_browser
+
+    # stop the zeroconf engine even if Package Control isn't installed
+    mdns_browser.close()
+
     from package_control import events
 
     if events.remove(package_name):
@@ -103,8 +108,12 @@ class DeviotListener(EventListener):
 
         # remove open used serials ports
         from .libraries import serial
+        from .commands.deviot_replay_capture import stop_replays
         
         window_name = view.name()
+
+        # the console of a capture replay was closed
+        stop_replays(window_name)
         search_id = window_name.split(" | ")
 
         if(len(search_id) > 1 and search_id[1] in serial.serials_in_use):
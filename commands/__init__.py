@@ -13,6 +13,7 @@ from .deviot_extra_library_folder import DeviotExtraLibraryFolderCommand
 from .deviot_remove_extra_library_folder import DeviotRemoveExtraLibraryFolderCommand
 from .deviot_compile_sketch import DeviotCompileSketchCommand
 from .deviot_upload_sketch import DeviotUploadSketchCommand
+from .deviot_upload_multiple import DeviotUploadMultipleCommand
 from .deviot_overwrite_upload_baud import DeviotOverwriteUploadBaudCommand
 from .deviot_clean_sketch import DeviotCleanSketchCommand
 from .deviot_freeze_sketch import DeviotFreezeSketchCommand
@@ -27,6 +28,7 @@ from .deviot_select_port import DeviotSelectPortCommand
 from .deviot_set_password import DeviotSetPasswordCommand
 from .deviot_toggle_serial_monitor import DeviotToggleSerialMonitorCommand
 from .deviot_send_serial_monitor import DeviotSendSerialMonitorCommand
+from .deviot_send_file_serial import DeviotSendFileSerialCommand
 from .deviot_output_console import DeviotOutputConsoleCommand
 from .deviot_send_persistent import DeviotSendPersistentCommand
 from .deviot_automatic_scroll import DeviotAutomaticScrollCommand
@@ -50,7 +52,12 @@ from .deviot_donate import DeviotDonateCommand
 from .deviot_about import DeviotAboutCommand
 from .deviot_pio_about import DeviotPioAboutCommand
 from .deviot_clean_view import DeviotCleanViewCommand
+from .deviot_trim_view import DeviotTrimViewCommand
 from .deviot_clean_console import DeviotCleanConsoleCommand
+from .deviot_search_console_log import DeviotSearchConsoleLogCommand
+from .deviot_serial_capture import DeviotSerialCaptureCommand
+from .deviot_replay_capture import DeviotReplayCaptureCommand
+from .deviot_stop_replay import DeviotStopReplayCommand
 from .deviot_reload import DeviotReloadCommand
 from .deviot_set_ip import DeviotSetIpCommand
 from .deviot_history import InputTextHistoryCommand
@@ -72,6 +79,7 @@ __all__ = [
     'DeviotRemoveExtraLibraryFolderCommand',
     'DeviotCompileSketchCommand',
     'DeviotUploadSketchCommand',
+    'DeviotUploadMultipleCommand',
     'DeviotOverwriteUploadBaudCommand',
     'DeviotCleanSketchCommand',
     'DeviotFreezeSketchCommand',
@@ -86,6 +94,7 @@ __all__ = [
     'DeviotSetPasswordCommand',
     'DeviotToggleSerialMonitorCommand',
     'DeviotSendSerialMonitorCommand',
+    'DeviotSendFileSerialCommand',
     'DeviotSendPersistentCommand',
     'DeviotOutputConsoleCommand',
     'DeviotStatusInformationCommand',
@@ -109,7 +118,12 @@ __all__ = [
     'DeviotAboutCommand',
     'DeviotPioAboutCommand',
     'DeviotCleanViewCommand',
+    'DeviotTrimViewCommand',
     'DeviotCleanConsoleCommand',
+    'DeviotSearchConsoleLogCommand',
+    'DeviotSerialCaptureCommand',
+    'DeviotReplayCaptureCommand',
+    'DeviotStopReplayCommand',
     'DeviotReloadCommand',
     'DeviotSetIpCommand',
     'InputTextHistoryCommand',
@@ -2,5 +2,5 @@ from sublime_plugin import WindowCommand
 from ..platformio.compile import Compile
 
 class DeviotCompileSketchCommand(WindowCommand):
-    def run(self):
-        Compile()
\ No newline at end of file
+    def run(self, all_envs=False):
+        Compile(all_envs=all_envs)
\ No newline at end of file
@@ -0,0 +1,104 @@
+from os import path
+from threading import Thread, Event, Lock
+from sublime_plugin import WindowCommand
+from ..libraries.serial_capture import capture_list, CaptureReader
+from ..libraries.serial import DisplayFormatter
+from ..libraries.messages import Messages
+from ..libraries.tools import get_setting
+from ..libraries.I18n import I18n
+from ..libraries import __version__ as version
+
+# stop event of each replay running, by the name of its console
+replays = {}
+replays_lock = Lock()
+
+
+def stop_replays(name=None):
+    """Stop replays
+
+    Ends the replay shown in the given console, or all of them
+
+    Keyword Arguments:
+        name {str} -- name of the replay console (default: {None})
+    """
+    with replays_lock:
+        for replay_name, stop in replays.items():
+            if(name is None or replay_name == name):
+                stop.set()
+
+
+class DeviotReplayCaptureCommand(WindowCommand):
+    """
+    Replays a serial capture in a new console, with the display mode
+    selected and at the original or an accelerated speed
+
+    Extends: sublime_plugin.WindowCommand
+    """
+    speeds = [["1x", 1.0], ["2x", 2.0], ["10x", 10.0], ["Max", 0]]
+
+    def run(self):
+        self.captures = capture_list()
+
+        if(not self.captures):
+            self.window.status_message(I18n().translate('capture_none'))
+            return
+
+        items = [[path.basename(file), '{0:.1f} KB'.format(path.getsize(file) / 1024)]
+                 for file in self.captures]
+
+        self.window.show_quick_panel(items, self.on_capture)
+
+    def on_capture(self, selected):
+        if(selected == -1):
+            return
+
+        self.capture = self.captures[selected]
+
+        items = [[speed[0]] for speed in self.speeds]
+        self.window.show_quick_panel(items, self.on_speed)
+
+    def on_speed(self, selected):
+        if(selected == -1):
+            return
+
+        speed = self.speeds[selected][1]
+
+        thread = Thread(target=self.replay, args=(self.capture, speed))
+        thread.start()
+
+    def replay(self, file, speed):
+        direction = get_setting('monitor_direction', 'right')
+        output_console = get_setting('output_console', False)
+
+        messages = Messages()
+        messages.panel_name('capture_replay_header{0}{1}', version, path.basename(file))
+        messages.create_panel(direction=direction, in_file=not output_console)
+
+        # a replay of the same capture is replaced by the new one
+        name = messages._name
+        stop = Event()
+        with replays_lock:
+            if(name in replays):
+                replays[name].set()
+            replays[name] = stop
+
+        formatter = DisplayFormatter(get_setting('display_mode', 'Text'))
+
+        try:
+            reader = CaptureReader(file)
+        except (ValueError, IOError, OSError):
+            messages.print('capture_invalid')
+            self.end_replay(name, stop)
+            return
+
+        try:
+            reader.replay(lambda data: messages.print_raw(formatter.format(data)),
+                          speed, stop=stop)
+        finally:
+            reader.close()
+            self.end_replay(name, stop)
+
+    def end_replay(self, name, stop):
+        with replays_lock:
+            if(replays.get(name) is stop):
+                del replays[name]
@@ -0,0 +1,53 @@
+from threading import Thread
+from sublime import ENCODED_POSITION
+from sublime_plugin import WindowCommand
+from ..libraries.console_log import search_console_logs
+from ..libraries.thread_progress import ThreadProgress
+from ..libraries.I18n import I18n
+
+class DeviotSearchConsoleLogCommand(WindowCommand):
+    """
+    Searches a regular expression in the history of the consoles
+    stored in disk, and opens the selected result
+
+    Extends: sublime_plugin.WindowCommand
+    """
+    results = []
+
+    def run(self):
+        _ = I18n().translate
+
+        caption = _("search_log_caption")
+        self.window.show_input_panel(caption, '', self.on_done, None, None)
+
+    def on_done(self, pattern):
+        if(not pattern):
+            return
+
+        thread = Thread(target=self.search, args=(pattern,))
+        thread.start()
+        ThreadProgress(thread, I18n().translate('processing'), '')
+
+    def search(self, pattern):
+        from os import path
+
+        try:
+            self.results = search_console_logs(pattern)
+        except Exception:
+            self.results = []
+
+        if(not self.results):
+            self.window.status_message(I18n().translate('search_log_none'))
+            return
+
+        items = [[line.strip() or ' ', '{0}:{1}'.format(path.basename(file), number)]
+                 for file, number, line in self.results]
+
+        self.window.show_quick_panel(items, self.on_select)
+
+    def on_select(self, selected):
+        if(selected == -1):
+            return
+
+        file, number, line = self.results[selected]
+        self.window.open_file('{0}:{1}'.format(file, number), ENCODED_POSITION)
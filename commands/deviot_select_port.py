@@ -1,11 +1,77 @@
+from threading import Thread
+from sublime import set_timeout
 from sublime_plugin import WindowCommand
 from ..libraries.quick_menu import QuickMenu
+from ..libraries.serial_ports import port_registry
 
 class DeviotSelectPortCommand(WindowCommand):
+    """
+    Shows the serial ports and mDNS devices to select the port used to
+    upload and by the serial monitor. The list is built in a new thread,
+    the mDNS devices are probed and it would block the UI. While the
+    panel is open, it's shown again with the new list when a serial port
+    is plugged or unplugged
+
+    Extends: sublime_plugin.WindowCommand
+    """
+
     def run(self):
-        Quick = QuickMenu()
-        items = Quick.serial_list()
-        callback = Quick.callback_serial_ports
-        Quick.set_list(items)
+        self.quick = QuickMenu()
+        self.generation = 0
+        self.watching = False
+
+        thread = Thread(target=self.load_ports)
+        thread.start()
+
+    def load_ports(self):
+        self.quick.set_list(self.quick.serial_list())
+        set_timeout(self.show, 0)
+
+    def show(self):
+        self.generation += 1
+        generation = self.generation
+
+        self.watching = True
+        port_registry.subscribe(self.on_port_change)
+
+        self.quick.show_quick_panel(lambda selected: self.on_select(generation, selected))
+
+    def on_select(self, generation, selected):
+        # the panel was replaced by the one with the updated list
+        if(generation != self.generation):
+            return
+
+        self.generation += 1
+        self.watching = False
+        port_registry.unsubscribe(self.on_port_change)
+
+        self.quick.callback_serial_ports(selected)
+
+    def on_port_change(self, event, port):
+        """Port change
+
+        Called by the port registry (from its polling thread) when a port
+        is added or removed, the list is built again in that thread
+
+        Arguments:
+            event {str} -- ADDED or REMOVED
+            port {str} -- port name
+        """
+        if(not self.watching):
+            return
+
+        self.watching = False
+        port_registry.unsubscribe(self.on_port_change)
+
+        generation = self.generation
+        self.quick.set_list(self.quick.serial_list())
+        set_timeout(lambda: self.reload(generation), 0)
+
+    def reload(self, generation):
+        # the panel was closed while the list was being built
+        if(generation != self.generation):
+            return
 
-        Quick.show_quick_panel(callback)
\ No newline at end of file
+        self.generation += 1
+        self.window.run_command('hide_overlay')
+        self.show()
@@ -0,0 +1,74 @@
+from os import path
+from sublime_plugin import WindowCommand
+from ..libraries import serial
+from ..libraries.serial_transfer import PROTOCOLS
+from ..libraries.tools import get_setting
+from ..libraries.I18n import I18n
+
+class DeviotSendFileSerialCommand(WindowCommand):
+    """
+    Sends a file to the device connected to the serial monitor running,
+    raw or with the XMODEM/YMODEM protocols
+
+    Extends: sublime_plugin.WindowCommand
+    """
+
+    def run(self):
+        _ = I18n().translate
+
+        if(not self.get_monitor()):
+            self.window.status_message(_('serial_not_available'))
+            return
+
+        view = self.window.active_view()
+        file_path = view.file_name() if view else None
+
+        caption = _("send_file_caption")
+        self.window.show_input_panel(caption, file_path or '', self.on_done, None, None)
+
+    def on_done(self, file_path):
+        file_path = path.expanduser(file_path.strip())
+
+        if(not path.isfile(file_path)):
+            self.window.status_message(I18n().translate('send_file_not_found'))
+            return
+
+        self.file_path = file_path
+
+        items = [[protocol] for protocol in PROTOCOLS]
+        self.window.show_quick_panel(items, self.on_protocol)
+
+    def on_protocol(self, selected):
+        if(selected == -1):
+            return
+
+        _ = I18n().translate
+
+        # the monitor can be stopped while the panels were open
+        monitor = self.get_monitor()
+        if(not monitor):
+            self.window.status_message(_('serial_not_available'))
+            return
+
+        if(not monitor.send_file(self.file_path, PROTOCOLS[selected])):
+            self.window.status_message(_('send_file_running'))
+
+    def get_monitor(self):
+        """Running monitor
+
+        Monitor running in the selected port
+
+        Returns:
+            SerialMonitor -- None if there isn't a monitor running
+        """
+        port_id = get_setting('port_id', None)
+
+        if(port_id and port_id in serial.serials_in_use):
+            monitor = serial.serial_monitor_dict.get(port_id, None)
+
+            if(monitor and monitor.is_running()):
+                return monitor
+        return None
+
+    def is_enabled(self):
+        return self.get_monitor() is not None
@@ -0,0 +1,17 @@
+from sublime_plugin import WindowCommand
+from ..libraries.tools import get_setting, save_setting
+
+class DeviotSerialCaptureCommand(WindowCommand):
+    """
+    Enables/disables the raw capture of the data received by the serial
+    monitor, it will be used the next time the monitor is started
+
+    Extends: sublime_plugin.WindowCommand
+    """
+
+    def run(self):
+        serial_capture = get_setting('serial_capture', False)
+        save_setting('serial_capture', not serial_capture)
+
+    def is_checked(self):
+        return get_setting('serial_capture', False)
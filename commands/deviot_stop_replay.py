@@ -0,0 +1,15 @@
+from sublime_plugin import WindowCommand
+from .deviot_replay_capture import replays, stop_replays
+
+class DeviotStopReplayCommand(WindowCommand):
+    """
+    Stops all the serial captures being replayed
+
+    Extends: sublime_plugin.WindowCommand
+    """
+
+    def run(self):
+        stop_replays()
+
+    def is_enabled(self):
+        return bool(replays)
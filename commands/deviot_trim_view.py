@@ -0,0 +1,17 @@
+from sublime import Region
+from sublime_plugin import TextCommand
+
+class DeviotTrimViewCommand(TextCommand):
+    """
+    Removes the first lines of the view
+
+    Extends: sublime_plugin.TextCommand
+    """
+
+    def run(self, edit, lines):
+        end = self.view.text_point(lines, 0)
+
+        read_only = self.view.is_read_only()
+        self.view.set_read_only(False)
+        self.view.erase(edit, Region(0, end))
+        self.view.set_read_only(read_only)
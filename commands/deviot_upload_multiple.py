@@ -0,0 +1,64 @@
+from threading import Thread
+from sublime import set_timeout
+from sublime_plugin import WindowCommand
+from ..platformio.upload import Upload
+from ..libraries.serial import serial_port_list
+from ..libraries.preferences_bridge import PreferencesBridge
+from ..libraries.quick_panel import quick_panel
+from ..libraries.tools import get_setting, save_setting
+from ..libraries.I18n import I18n
+
+class DeviotUploadMultipleCommand(WindowCommand):
+    """
+    Shows the serial ports and mDNS devices to select the ones where the
+    sketch will be uploaded at the same time. Each item selected is
+    checked/unchecked, the first item starts the upload. The selection
+    is stored in the preferences file to be used the next time
+
+    Extends: sublime_plugin.WindowCommand
+    """
+
+    def run(self):
+        thread = Thread(target=self.load_ports)
+        thread.start()
+
+    def load_ports(self):
+        self.ports = [[port[0], port[2]] for port in serial_port_list()]
+        self.ports.extend([[service[0], service[1]]
+                           for service in PreferencesBridge().get_mdns_services(True)])
+
+        available = [port[1] for port in self.ports]
+        self.selected = [port for port in get_setting('upload_ports', [])
+                         if port in available]
+
+        set_timeout(lambda: self.show(0), 0)
+
+    def show(self, index):
+        _ = I18n().translate
+
+        items = [[_('upload_multiple_start{0}', len(self.selected)),
+                  _('upload_multiple_start_sub')]]
+
+        for caption, port in self.ports:
+            check = '[x] ' if port in self.selected else '[ ] '
+            items.append([check + port, caption])
+
+        quick_panel(items, self.on_select, index=index)
+
+    def on_select(self, selected):
+        if(selected == -1):
+            return
+
+        if(selected == 0):
+            if(self.selected):
+                save_setting('upload_ports', self.selected)
+                Upload(ports=list(self.selected))
+            return
+
+        port = self.ports[selected - 1][1]
+        if(port in self.selected):
+            self.selected.remove(port)
+        else:
+            self.selected.append(port)
+
+        set_timeout(lambda: self.show(selected), 0)
@@ -0,0 +1,276 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Full history of the Deviot consoles stored in disk.
+
+The console views only keep the last lines (see Messages.trim_view), all
+the text printed is also stored in a log file in the cache folder. When a
+log reaches its max size, it's rotated (name.log -> name.log.1 -> ...) and
+the oldest one is removed. The logs are searched with mmap, so they don't
+need to be loaded in memory or in a view.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from __future__ import unicode_literals
+
+import os
+import re
+import mmap
+import threading
+
+from .paths import getCacheDir
+from .tools import get_setting
+
+# max size of each log file (bytes)
+LOG_SIZE = 10 * 1024 * 1024
+# number of rotated files kept
+LOG_BACKUPS = 5
+
+_logs = {}
+_logs_lock = threading.Lock()
+
+
+def getLogDir():
+    """
+    Folder where the console logs are stored
+    """
+    log_dir = os.path.join(getCacheDir(), 'logs')
+
+    if(not os.path.isdir(log_dir)):
+        os.makedirs(log_dir)
+
+    return log_dir
+
+
+def get_console_log(name):
+    """Console Log
+
+    Gets the log of the console with the given name, the same object is
+    returned to all the consoles with the same name
+
+    Arguments:
+        name {str} -- name of the console (view name)
+
+    Returns:
+        ConsoleLog/None -- None when the console_log option is disabled
+    """
+    if(not name or not get_setting('console_log', True)):
+        return None
+
+    file_name = re.sub(r'[^\w\-. ]+', '_', name).strip(' _.') or 'console'
+
+    with _logs_lock:
+        if(file_name not in _logs):
+            path = os.path.join(getLogDir(), file_name + '.log')
+            _logs[file_name] = ConsoleLog(path)
+
+        return _logs[file_name]
+
+
+def search_console_logs(pattern, max_results=1000):
+    """Search logs
+
+    Searches a regular expression in the logs of all the consoles
+
+    Arguments:
+        pattern {str} -- regular expression
+
+    Keyword Arguments:
+        max_results {int} -- stop after this number of lines
+
+    Returns:
+        list -- (file path, line number, line text)
+    """
+    with _logs_lock:
+        logs = list(_logs.values())
+
+    for log in logs:
+        log.flush()
+
+    log_dir = getLogDir()
+    results = []
+
+    for file in sorted(os.listdir(log_dir)):
+        if('.log' not in file):
+            continue
+
+        file_path = os.path.join(log_dir, file)
+        left = max_results - len(results)
+        results.extend(search_file(file_path, pattern, left))
+
+        if(len(results) >= max_results):
+            break
+
+    return results
+
+
+class ConsoleLog(object):
+    """
+    Append only log file with size based rotation
+    """
+
+    def __init__(self, path, max_size=LOG_SIZE, backups=LOG_BACKUPS):
+        self.path = path
+        self.max_size = max_size
+        self.backups = backups
+        self.lock = threading.Lock()
+        self.file = None
+        self.size = 0
+
+    def write(self, text):
+        """Write
+
+        Appends the text to the log, rotating the file if it's full
+
+        Arguments:
+            text {str} -- console text
+        """
+        data = text.encode('utf-8', 'replace')
+
+        with self.lock:
+            if(self.file is None):
+                self.open()
+
+            if(self.size + len(data) > self.max_size and self.size):
+                self.rotate()
+
+            self.file.write(data)
+            self.size += len(data)
+
+    def flush(self):
+        with self.lock:
+            if(self.file):
+                self.file.flush()
+
+    def close(self):
+        with self.lock:
+            if(self.file):
+                self.file.close()
+                self.file = None
+
+    def open(self):
+        """
+        Opens the log file in append mode
+        """
+        self.file = open(self.path, 'ab')
+        self.size = self.file.tell()
+
+    def rotate(self):
+        """
+        Moves name.log to name.log.1, name.log.1 to name.log.2, etc.
+        and starts a new empty file
+        """
+        self.file.close()
+
+        oldest = '{0}.{1}'.format(self.path, self.backups)
+        if(os.path.exists(oldest)):
+            os.remove(oldest)
+
+        for index in range(self.backups - 1, 0, -1):
+            src = '{0}.{1}'.format(self.path, index)
+            if(os.path.exists(src)):
+                os.rename(src, '{0}.{1}'.format(self.path, index + 1))
+
+        if(self.backups):
+            os.rename(self.path, self.path + '.1')
+        else:
+            os.remove(self.path)
+
+        self.open()
+
+    def files(self):
+        """Files
+
+        Returns:
+            list -- log files from the oldest to the newest
+        """
+        files = ['{0}.{1}'.format(self.path, index)
+                 for index in range(self.backups, 0, -1)]
+        files.append(self.path)
+
+        return [file for file in files if os.path.exists(file)]
+
+    def search(self, pattern, max_results=1000):
+        """Search
+
+        Searches a regular expression in all the files of the log,
+        see search_file
+
+        Arguments:
+            pattern {str} -- regular expression
+
+        Keyword Arguments:
+            max_results {int} -- stop after this number of lines
+
+        Returns:
+            list -- (file path, line number, line text)
+        """
+        self.flush()
+
+        results = []
+        for file_path in self.files():
+            left = max_results - len(results)
+            results.extend(search_file(file_path, pattern, left))
+
+            if(len(results) >= max_results):
+                break
+
+        return results
+
+
+def search_file(file_path, pattern, max_results=1000):
+    """Search in file
+
+    Searches a regular expression in a file mapping it in memory, the file
+    is never loaded entirely. Only one result by line is returned
+
+    Arguments:
+        file_path {str} -- path of the file
+        pattern {str} -- regular expression
+
+    Keyword Arguments:
+        max_results {int} -- stop after this number of lines
+
+    Returns:
+        list -- (file path, line number, line text)
+    """
+    results = []
+
+    if(not os.path.getsize(file_path)):
+        return results
+
+    regex = re.compile(pattern.encode('utf-8'), re.MULTILINE)
+
+    with open(file_path, 'rb') as file:
+        memory = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            line_number = 1
+            position = 0
+            end = -1
+
+            for match in regex.finditer(memory):
+                start = match.start()
+                if(start <= end):
+                    continue
+
+                begin = memory.rfind(b'\n', 0, start) + 1
+                end = memory.find(b'\n', start)
+                end = len(memory) if end < 0 else end
+
+                # count only the lines between the last result and this one
+                line_number += memory[position:begin].count(b'\n')
+                position = begin
+
+                line = memory[begin:end].decode('utf-8', 'replace')
+                results.append((file_path, line_number, line))
+
+                if(len(results) >= max_results):
+                    break
+        finally:
+            memory.close()
+
+    return results
@@ -1,116 +1,386 @@
-from time import sleep
+"""
+Persistent browser of the arduino (esp) instances in the local network.
+
+A single Zeroconf instance and service browser run for the whole plugin
+session (started the first time the list is requested). The devices found
+are kept in a cache that follows the TTL of the records announced: a device
+is removed when its PTR record expires or when it sends a goodbye packet,
+and the address is refreshed from the A record when it changes. The list
+of devices is served from that cache without wait.
+
+Subscribers receive an event when a device is added or removed.
+
+A record can outlive the device (it was unplugged without a goodbye), so
+the port picker probes all the devices at the same time with a short TCP
+connect and sorts them by their round trip time.
+"""
+
+import time
+import errno
+import socket
+import select
+import threading
+
 from socket import inet_ntoa
 from .zeroconf import ServiceBrowser, ServiceStateChange, Zeroconf
+from .zeroconf import _TYPE_A, _CLASS_IN
+
+SERVICE_TYPE = '_arduino._tcp.local.'
+# seconds waiting for the first answers when the browser is started
+DISCOVERY_TIME = 0.5
+# seconds before try to start the browser again (no network)
+RETRY_INTERVAL = 10
+# milliseconds waiting the info of a new device, and attempts
+RESOLVE_TIMEOUT = 3000
+RESOLVE_ATTEMPTS = 3
+# seconds waiting the answer of the devices when they are probed
+PROBE_TIMEOUT = 0.5
 
-current_services = {}
-count_services = {}
+# connect_ex results of a connection in progress
+IN_PROGRESS = (0, errno.EINPROGRESS, errno.EWOULDBLOCK,
+               getattr(errno, 'WSAEWOULDBLOCK', errno.EWOULDBLOCK))
+# the host answered, but the port is closed (OTA uses UDP)
+REFUSED = (errno.ECONNREFUSED, getattr(errno, 'WSAECONNREFUSED', errno.ECONNREFUSED))
 
-class MDNSBrowser:
+ADDED = 'added'
+REMOVED = 'removed'
+
+
+class MDNSBrowser(object):
     """
     Class for zeroconf multicast DNS service discovery of arduino (esp)
     instances in local network
     """
 
-    def __init__(self):
-        global count_services
-        global current_services
-
+    def __init__(self, service_type=SERVICE_TYPE, interfaces=None):
+        self.service_type = service_type
+        self.interfaces = interfaces
         self._zeroconf = None
         self._browser = None
-        self.temp_addresses = []
+        self._devices = {}
+        self._subscribers = []
+        self._last_failure = None
+        self._lock = threading.RLock()
 
     def start(self):
         """Start zeroconf
-        
-        Starts to browsing in the arduino instance
+
+        Starts the browser if it isn't running, the first time it waits
+        DISCOVERY_TIME seconds to receive the answers of the devices
+
+        Returns:
+            bool -- True if the browser is running
         """
-        try:
-            self._zeroconf = Zeroconf()
-        except:
-            # not connected
-            return
+        with self._lock:
+            if(self._zeroconf):
+                return True
+
+            if(self._last_failure and time.time() - self._last_failure < RETRY_INTERVAL):
+                return False
+
+            try:
+                if(self.interfaces):
+                    self._zeroconf = Zeroconf(interfaces=self.interfaces)
+                else:
+                    self._zeroconf = Zeroconf()
+            except Exception:
+                # not connected
+                self._last_failure = time.time()
+                return False
+
+            self._last_failure = None
+            self._browser = ServiceBrowser(self._zeroconf, self.service_type,
+                                           handlers=[self.on_service_state_change])
+
+        time.sleep(DISCOVERY_TIME)
+        return True
+
+    def close(self):
+        """Close
+
+        Stops the browser and clears the devices found
+        """
+        with self._lock:
+            zeroconf = self._zeroconf
+            self._zeroconf = None
+            self._browser = None
+            self._devices.clear()
+
+        if(zeroconf):
+            zeroconf.close()
+
+    def subscribe(self, callback):
+        """Subscribe
 
-        self._browser = ServiceBrowser(self._zeroconf, '_arduino._tcp.local.',
-                                       handlers=[self.on_service_state_change])
-        sleep(0.20)
-        self._zeroconf.close()
-        self.service_check()
+        Calls the callback when a device is added or removed, from the
+        zeroconf engine thread. The browser is started if it isn't running
+
+        Arguments:
+            callback {function} -- callback(event, device) event can
+                                   be ADDED or REMOVED
+        """
+        with self._lock:
+            if(callback not in self._subscribers):
+                self._subscribers.append(callback)
+
+        self.start()
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            if(callback in self._subscribers):
+                self._subscribers.remove(callback)
+
+    def notify(self, event, device):
+        with self._lock:
+            subscribers = list(self._subscribers)
+
+        for callback in subscribers:
+            callback(event, device)
 
     def on_service_state_change(self, zeroconf, service_type, name, state_change):
         """Service state change
 
-        Runs every time service in MDNS changes state(removed, added, modified).
-        On service added, the device will be add to self. services
+        Runs (in the engine thread of zeroconf) every time a service in
+        MDNS changes its state. A new service is resolved without block,
+        to not delay the other changes while the device answers
+        """
+        if(state_change is ServiceStateChange.Added):
+            self.resolve(zeroconf, name)
+
+        elif(state_change is ServiceStateChange.Removed):
+            with self._lock:
+                device = self._devices.pop(name, None)
+
+            if(device):
+                self.notify(REMOVED, device)
+
+    def resolve(self, zeroconf, name, attempt=1):
+        """Resolve service
 
-        The list will have the following format:
-        [{
-            'address': 'ip string', 
-            'port': 'port string', 
-            'weight': 'weight string', 
+        Requests the address, port and properties of a new service, the
+        request is sent again RESOLVE_ATTEMPTS times if the device doesn't
+        answer
+
+        Arguments:
+            zeroconf {Zeroconf} -- instance that found the service
+            name {str} -- service name
+
+        Keyword Arguments:
+            attempt {int} -- number of the request (default: {1})
+        """
+        def on_info(info):
+            if(info and info.address):
+                self.add_device(zeroconf, name, info)
+            elif(attempt < RESOLVE_ATTEMPTS and not zeroconf.done):
+                self.resolve(zeroconf, name, attempt + 1)
+
+        zeroconf.request_service_info(self.service_type, name, on_info, RESOLVE_TIMEOUT)
+
+    def add_device(self, zeroconf, name, info):
+        """Add device
+
+        Adds the service resolved to the cache with the following format:
+
+        {
+            'name': 'service name',
+            'server': 'host name',
+            'address': 'ip string',
+            'port': 'port string',
+            'weight': 'weight string',
             'priority': 'priority string'
             'board': 'board string',
             'ssh_upload' 'yes/no',
             'auth_upload': 'yes/no'
-        }]
+        }
+
+        Arguments:
+            zeroconf {Zeroconf} -- instance that found the service
+            name {str} -- service name
+            info {ServiceInfo} -- info of the service
         """
-        if(state_change is ServiceStateChange.Added):
-            device = {}
-
-            info = zeroconf.get_service_info(service_type, name)
-            if(info):
-                address = inet_ntoa(info.address)
-                device['address'] = address
-                device['port'] = info.port
-                device['weight'] = info.weight
-                device['priority'] = info.priority
-                for key, value in info.properties.items():
-                    key = key.decode("utf-8")
-                    value = value.decode("utf-8")
-                    device[key] = value
-
-                count_services[address] = 0
-                current_services[address] = device
-                self.temp_addresses.append(address)
-
-    def service_check(self):
-        """Check Services
-        
-        Some times zeroconf can not see a device that was previously connected.
-        With the use of two global variables, it will stop to show a device only
-        if it is not found the number of time in the "threshold" variable.
+        device = {}
+        device['name'] = name
+        device['server'] = info.server
+        device['address'] = inet_ntoa(info.address)
+        device['port'] = info.port
+        device['weight'] = info.weight
+        device['priority'] = info.priority
+        for key, value in info.properties.items():
+            key = key.decode("utf-8")
+            if(isinstance(value, bytes)):
+                value = value.decode("utf-8")
+            device[key] = value
+
+        with self._lock:
+            # removed while it was being resolved
+            if(zeroconf is not self._zeroconf or not self.is_alive(name)):
+                return
+            self._devices[name] = device
+
+        self.notify(ADDED, device)
+
+    def is_alive(self, name):
+        """Alive
+
+        Checks if the PTR record of the service is still valid (it's not
+        expired and no goodbye packet was received)
+
+        Arguments:
+            name {str} -- service name
+
+        Returns:
+            bool -- True if the device is available
+        """
+        zeroconf = self._zeroconf
+        if(not zeroconf):
+            return False
+
+        return zeroconf.cache.current_entry_with_name_and_alias(
+            self.service_type, name) is not None
+
+    def devices(self):
+        """Devices
+
+        Devices in the cache with a valid record. The address is updated
+        if the device announced a new one
+
+        Returns:
+            list -- device info
         """
-        threshold = 8
+        with self._lock:
+            zeroconf = self._zeroconf
+            devices = []
 
-        counter = count_services.keys()
-        removed = list(set(counter) - set(self.temp_addresses))
+            for name, device in self._devices.items():
+                if(not self.is_alive(name)):
+                    continue
 
-        for address in removed:
-            count_services[address] = count_services[address] + 1
+                record = zeroconf.cache.get_by_details(device['server'], _TYPE_A, _CLASS_IN)
+                if(record and not record.is_expired(time.time() * 1000)):
+                    device['address'] = inet_ntoa(record.address)
 
-        from copy import deepcopy
+                devices.append(dict(device))
 
-        temp_count = deepcopy(count_services)
-        for key, value in temp_count.items():
-            if(value >= threshold):
-                del count_services[key]
-                del current_services[key]
+        return devices
 
-    def formated_list(self):
+    def formated_list(self, check=False):
         """List of services
-        
+
         Returns only the neccessary data to work with the plugin
-        
+
+        Keyword Arguments:
+            check {bool} -- probe the devices, the caption shows the
+                            round trip time (or that the device isn't
+                            reachable) and the reachable devices are
+                            sorted first, the fastest first (default: {False})
+
         Returns:
             list -- board id and addres (ip)
         """
+        self.start()
+
+        devices = self.devices()
+        latencies = {}
+
+        if(check and devices):
+            from ..I18n import I18n
+
+            translate = I18n().translate
+            latencies = probe([(device['address'], int(device['port']))
+                               for device in devices])
+
         mdns_list = []
-        if(len(current_services) > 0):
-            for key, value in current_services.items():
-                address = value['address']
-                board = value['board'].capitalize()
-                auth = value['auth_upload']
+        for device in devices:
+            address = device['address']
+            board = device.get('board', '').capitalize()
+            auth = device.get('auth_upload', 'no')
+
+            caption = "{0} ({1})".format(board, address)
+
+            if(check):
+                latency = latencies.get((address, int(device['port'])))
+                if(latency is None):
+                    caption += ' - ' + translate('mdns_unreachable')
+                else:
+                    caption += ' - {0} ms'.format(latency)
+                device['latency'] = latency
+
+            mdns_list.append([caption, address, auth])
+
+        if(check):
+            order = [device['latency'] for device in devices]
+            mdns_list = [item for latency, item in
+                         sorted(zip(order, mdns_list),
+                                key=lambda pair: (pair[0] is None, pair[0] or 0))]
+
+        return mdns_list
+
+
+def probe(targets, timeout=PROBE_TIMEOUT):
+    """Probe devices
+
+    Connects (TCP) to all the targets at the same time, with non
+    blocking sockets, to know which devices are still online. A device
+    that refuses the connection is reachable too, the port announced is
+    used by the OTA through UDP and it can be closed for TCP.
+
+    Arguments:
+        targets {list} -- (address, port) of each device
+
+    Keyword Arguments:
+        timeout {float} -- seconds waiting the answers (default: {PROBE_TIMEOUT})
+
+    Returns:
+        dict -- (address, port): round trip in milliseconds, or None if
+                the device didn't answer
+    """
+    results = dict((target, None) for target in targets)
+    pending = {}
+
+    for target in results:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        start = time.time()
+
+        try:
+            code = sock.connect_ex(target)
+        except (socket.error, OverflowError, TypeError):
+            sock.close()
+            continue
+
+        if(code in IN_PROGRESS):
+            pending[sock] = (target, start)
+        else:
+            if(code in REFUSED):
+                results[target] = round((time.time() - start) * 1000, 1)
+            sock.close()
+
+    end = time.time() + timeout
+
+    while(pending):
+        left = end - time.time()
+        if(left <= 0):
+            break
+
+        sockets = list(pending)
+        try:
+            rr, wr, er = select.select([], sockets, sockets, left)
+        except (select.error, socket.error):
+            break
+
+        now = time.time()
+        for sock in set(wr + er):
+            target, start = pending.pop(sock)
+            code = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+
+            if(code == 0 or code in REFUSED):
+                results[target] = round((now - start) * 1000, 1)
+            sock.close()
+
+    for sock in pending:
+        sock.close()
+
+    return results
 
-                caption = "{0} ({1})".format(board, address)
-                mdns_list.append([caption, address, auth])
 
-        return mdns_list
\ No newline at end of file
+mdns_browser = MDNSBrowser()
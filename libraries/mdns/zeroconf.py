@@ -25,6 +25,7 @@ from __future__ import (
 
 from . import enum
 import errno
+import heapq
 import logging
 import re
 import select
@@ -63,6 +64,7 @@ _CHECK_TIME = 175
 _REGISTER_TIME = 225
 _LISTENER_TIME = 200
 _BROWSER_TIME = 500
+_REAPER_TIME = 10 * 1000
 
 # Some DNS constants
 
@@ -149,6 +151,13 @@ _HAS_A_TO_Z = re.compile(r'[A-Za-z]')
 _HAS_ONLY_A_TO_Z_NUM_HYPHEN = re.compile(r'^[A-Za-z0-9\-]+$')
 _HAS_ASCII_CONTROL_CHARS = re.compile(r'[\x00-\x1f\x7f]')
 
+# precompiled formats of the incoming packets
+_HEADER = struct.Struct(b'!6H')
+_QUESTION = struct.Struct(b'!HH')
+_RECORD = struct.Struct(b'!HHiH')
+_SRV = struct.Struct(b'!HHH')
+_SHORT = struct.Struct(b'!H')
+
 
 @enum.unique
 class InterfaceChoice(enum.Enum):
@@ -596,12 +605,20 @@ class DNSService(DNSRecord):
 
 class DNSIncoming(QuietLogger):
 
-    """Object representation of an incoming DNS packet"""
+    """Object representation of an incoming DNS packet
+
+    The packet is parsed in place: the numbers are read with
+    precompiled structs (unpack_from) without slice the packet, only
+    the labels and the values kept in the records are copied. The
+    names read are cached by offset, a compressed pointer to a name
+    already read (or to a part of it) is resolved without walk the
+    labels again."""
 
     def __init__(self, data):
         """Constructor from string holding bytes of packet"""
         self.offset = 0
         self.data = data
+        self.names = {}  # maps offset to the name read from there
         self.questions = []
         self.answers = []
         self.id = 0
@@ -623,22 +640,21 @@ class DNSIncoming(QuietLogger):
                 'Choked at offset %d while unpacking %r', self.offset, data))
 
     def unpack(self, format_):
-        length = struct.calcsize(format_)
-        info = struct.unpack(
-            format_, self.data[self.offset:self.offset + length])
-        self.offset += length
+        """Reads the values of a precompiled struct.Struct"""
+        info = format_.unpack_from(self.data, self.offset)
+        self.offset += format_.size
         return info
 
     def read_header(self):
         """Reads header portion of packet"""
         (self.id, self.flags, self.num_questions, self.num_answers,
-         self.num_authorities, self.num_additionals) = self.unpack(b'!6H')
+         self.num_authorities, self.num_additionals) = self.unpack(_HEADER)
 
     def read_questions(self):
         """Reads questions section of packet"""
         for i in xrange(self.num_questions):
             name = self.read_name()
-            type_, class_ = self.unpack(b'!HH')
+            type_, class_ = self.unpack(_QUESTION)
 
             question = DNSQuestion(name, type_, class_)
             self.questions.append(question)
@@ -649,19 +665,22 @@ class DNSIncoming(QuietLogger):
 
     def read_character_string(self):
         """Reads a character string from the packet"""
-        length = indexbytes(self.data, self.offset)
+        length = self.data[self.offset]
         self.offset += 1
         return self.read_string(length)
 
     def read_string(self, length):
         """Reads a string of a given length from the packet"""
+        if self.offset + length > len(self.data):
+            raise IncomingDecodeError(
+                "String out of the packet at %s" % (self.offset,))
         info = self.data[self.offset:self.offset + length]
         self.offset += length
         return info
 
     def read_unsigned_short(self):
         """Reads an unsigned short from the packet"""
-        return self.unpack(b'!H')[0]
+        return self.unpack(_SHORT)[0]
 
     def read_others(self):
         """Reads the answers, authorities and additionals section of the
@@ -669,7 +688,8 @@ class DNSIncoming(QuietLogger):
         n = self.num_answers + self.num_authorities + self.num_additionals
         for i in xrange(n):
             domain = self.read_name()
-            type_, class_, ttl, length = self.unpack(b'!HHiH')
+            type_, class_, ttl, length = self.unpack(_RECORD)
+            end = self.offset + length
 
             rec = None
             if type_ == _TYPE_A:
@@ -682,10 +702,10 @@ class DNSIncoming(QuietLogger):
                 rec = DNSText(
                     domain, type_, class_, ttl, self.read_string(length))
             elif type_ == _TYPE_SRV:
+                priority, weight, port = self.unpack(_SRV)
                 rec = DNSService(
                     domain, type_, class_, ttl,
-                    self.read_unsigned_short(), self.read_unsigned_short(),
-                    self.read_unsigned_short(), self.read_name())
+                    priority, weight, port, self.read_name())
             elif type_ == _TYPE_HINFO:
                 rec = DNSHinfo(
                     domain, type_, class_, ttl,
@@ -693,11 +713,11 @@ class DNSIncoming(QuietLogger):
             elif type_ == _TYPE_AAAA:
                 rec = DNSAddress(
                     domain, type_, class_, ttl, self.read_string(16))
-            else:
-                # Try to ignore types we don't know about
-                # Skip the payload for the resource record so the next
-                # records can be parsed correctly
-                self.offset += length
+
+            # Skip the rest of the payload (or the payload of types
+            # we don't know about) so the next records can be parsed
+            # correctly
+            self.offset = end
 
             if rec is not None:
                 self.answers.append(rec)
@@ -716,37 +736,46 @@ class DNSIncoming(QuietLogger):
 
     def read_name(self):
         """Reads a domain name from the packet"""
-        result = ''
+        data = self.data
+        labels = []  # (offset, label) read before find the end
+        suffix = ''
         off = self.offset
         next_ = -1
         first = off
 
         while True:
-            length = indexbytes(self.data, off)
-            off += 1
+            length = data[off]
             if length == 0:
+                off += 1
                 break
             t = length & 0xC0
             if t == 0x00:
-                result = ''.join((result, self.read_utf(off, length) + '.'))
-                off += length
+                labels.append((off, self.read_utf(off + 1, length) + '.'))
+                off += 1 + length
             elif t == 0xC0:
                 if next_ < 0:
-                    next_ = off + 1
-                off = ((length & 0x3F) << 8) | indexbytes(self.data, off)
+                    next_ = off + 2
+                off = ((length & 0x3F) << 8) | data[off + 1]
                 if off >= first:
                     raise IncomingDecodeError(
                         "Bad domain name (circular) at %s" % (off,))
                 first = off
+                # the rest of the name was already read
+                suffix = self.names.get(off)
+                if suffix is not None:
+                    break
+                suffix = ''
             else:
                 raise IncomingDecodeError("Bad domain name at %s" % (off,))
 
-        if next_ >= 0:
-            self.offset = next_
-        else:
-            self.offset = off
+        # stores the name that starts at each label read
+        for label_offset, label in reversed(labels):
+            suffix = label + suffix
+            self.names[label_offset] = suffix
 
-        return result
+        self.offset = next_ if next_ >= 0 else off
+
+        return suffix
 
 
 class DNSOutgoing(object):
@@ -1064,6 +1093,22 @@ class DNSCache(object):
             return reduce(lambda a, b: a + b, values)
 
 
+class Timer(object):
+
+    """A callback scheduled in the engine, it can be cancelled."""
+
+    def __init__(self, when, callback):
+        self.when = when
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def __lt__(self, other):
+        return self.when < other.when
+
+
 class Engine(threading.Thread):
 
     """An engine wraps read access to sockets, allowing objects that
@@ -1073,6 +1118,12 @@ class Engine(threading.Thread):
     A reader needs a handle_read() method, which is called when the socket
     it is interested in is ready for reading.
 
+    The engine also runs the timers of the browsers, the service info
+    requests and the cache reaping, so a single thread serves all the
+    consumers of a Zeroconf instance. The thread sleeps in select()
+    until a socket is ready or the next timer is due, other threads
+    wake it up through a loopback socket.
+
     Writers are not implemented here, because we only send short
     packets.
     """
@@ -1082,43 +1133,104 @@ class Engine(threading.Thread):
         self.daemon = True
         self.zc = zc
         self.readers = {}  # maps socket to reader
-        self.timeout = 0.1
-        self.condition = threading.Condition()
+        self.timers = []  # heap of Timer
+        self.lock = threading.Lock()
+
+        self._wake_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._wake_socket.bind(('127.0.0.1', 0))
+        self._wake_socket.setblocking(False)
+        self._wake_address = self._wake_socket.getsockname()
+
         self.start()
 
     def run(self):
         while not self.zc.done:
-            with self.condition:
-                rs = self.readers.keys()
-                if len(rs) == 0:
-                    # No sockets to manage, but we wait for the timeout
-                    # or addition of a socket
-                    self.condition.wait(self.timeout)
-
-            if len(rs) != 0:
+            with self.lock:
+                rs = list(self.readers.keys()) + [self._wake_socket]
+                timeout = None
+                if self.timers:
+                    timeout = max(0, self.timers[0].when - current_time_millis())
+                    timeout /= 1000.0
+
+            try:
+                rr, wr, er = select.select(rs, [], [], timeout)
+            except (select.error, socket.error) as e:
+                # If the socket was closed by another thread, during
+                # shutdown, ignore it and exit
+                if self.zc.done:
+                    break
+                if e.args[0] != errno.EBADF:
+                    raise
+                continue
+
+            if self.zc.done:
+                break
+
+            for socket_ in rr:
+                if socket_ is self._wake_socket:
+                    self.drain()
+                    continue
+                reader = self.readers.get(socket_)
+                if reader:
+                    reader.handle_read(socket_)
+
+            self.run_timers()
+
+        self._wake_socket.close()
+
+    def run_timers(self):
+        """Runs the callbacks of the timers due"""
+        while True:
+            with self.lock:
+                if (not self.timers or
+                        self.timers[0].when > current_time_millis()):
+                    return
+                timer = heapq.heappop(self.timers)
+
+            if not timer.cancelled:
                 try:
-                    rr, wr, er = select.select(rs, [], [], self.timeout)
-                    if not self.zc.done:
-                        for socket_ in rr:
-                            reader = self.readers.get(socket_)
-                            if reader:
-                                reader.handle_read(socket_)
-
-                except (select.error, socket.error) as e:
-                    # If the socket was closed by another thread, during
-                    # shutdown, ignore it and exit
-                    if e.args[0] != socket.EBADF or not self.zc.done:
-                        raise
+                    timer.callback()
+                except Exception:  # TODO stop catching all Exceptions
+                    self.zc.log_exception_warning()
+
+    def drain(self):
+        try:
+            while self._wake_socket.recv(64):
+                pass
+        except socket.error:
+            pass
+
+    def wake_up(self):
+        """Interrupts the select() of the engine thread"""
+        if threading.current_thread() is self:
+            return
+        try:
+            self._wake_socket.sendto(b'\x00', self._wake_address)
+        except socket.error:
+            pass
+
+    def call_later(self, delay, callback):
+        """Runs the callback in the engine thread after the given
+        milliseconds. Returns a Timer that can be cancelled."""
+        timer = Timer(current_time_millis() + delay, callback)
+        with self.lock:
+            heapq.heappush(self.timers, timer)
+        self.wake_up()
+        return timer
+
+    def call_soon(self, callback):
+        """Runs the callback in the engine thread as soon as possible"""
+        return self.call_later(0, callback)
 
     def add_reader(self, reader, socket_):
-        with self.condition:
+        with self.lock:
             self.readers[socket_] = reader
-            self.condition.notify()
+        self.wake_up()
 
     def del_reader(self, socket_):
-        with self.condition:
+        with self.lock:
             del self.readers[socket_]
-            self.condition.notify()
+        self.wake_up()
 
 
 class Listener(QuietLogger):
@@ -1163,27 +1275,24 @@ class Listener(QuietLogger):
             self.zc.handle_response(msg)
 
 
-class Reaper(threading.Thread):
+class Reaper(object):
 
     """A Reaper is used by this module to remove cache entries that
-    have expired."""
+    have expired. It runs every 10 seconds in the engine thread."""
 
     def __init__(self, zc):
-        threading.Thread.__init__(self, name='zeroconf-Reaper')
-        self.daemon = True
         self.zc = zc
-        self.start()
+        self.zc.engine.call_later(_REAPER_TIME, self.run)
 
     def run(self):
-        while True:
-            self.zc.wait(10 * 1000)
-            if self.zc.done:
-                return
-            now = current_time_millis()
-            for record in self.zc.cache.entries():
-                if record.is_expired(now):
-                    self.zc.update_record(now, record)
-                    self.zc.cache.remove(record)
+        if self.zc.done:
+            return
+        now = current_time_millis()
+        for record in self.zc.cache.entries():
+            if record.is_expired(now):
+                self.zc.update_record(now, record)
+                self.zc.cache.remove(record)
+        self.zc.engine.call_later(_REAPER_TIME, self.run)
 
 
 class Signal(object):
@@ -1214,28 +1323,28 @@ class SignalRegistrationInterface(object):
         return self
 
 
-class ServiceBrowser(threading.Thread):
+class ServiceBrowser(object):
 
     """Used to browse for a service of a specific type.
 
     The listener object will have its add_service() and
     remove_service() methods called when this browser
-    discovers changes in the services availability."""
+    discovers changes in the services availability.
+
+    The queries are sent, and the handlers called, from the engine
+    thread of the Zeroconf instance."""
 
     def __init__(self, zc, type_, handlers=None, listener=None):
         """Creates a browser for a specific type"""
         assert handlers or listener, 'You need to specify at least one handler'
         if not type_.endswith(service_type_name(type_)):
             raise BadTypeInNameException
-        threading.Thread.__init__(
-            self, name='zeroconf-ServiceBrowser_' + type_)
-        self.daemon = True
         self.zc = zc
         self.type = type_
         self.services = {}
         self.next_time = current_time_millis()
         self.delay = _BROWSER_TIME
-        self._handlers_to_call = []
+        self.timer = None
 
         self._service_state_changed = Signal()
 
@@ -1261,7 +1370,7 @@ class ServiceBrowser(threading.Thread):
         for h in handlers:
             self.service_state_changed.register_handler(h)
 
-        self.start()
+        self.zc.engine.call_soon(self.start)
 
     @property
     def service_state_changed(self):
@@ -1273,9 +1382,9 @@ class ServiceBrowser(threading.Thread):
         Updates information required by browser in the Zeroconf cache."""
 
         def enqueue_callback(state_change, name):
-            self._handlers_to_call.append(
-                lambda zeroconf: self._service_state_changed.fire(
-                    zeroconf=zeroconf,
+            zc.engine.call_soon(
+                lambda: self.done or self._service_state_changed.fire(
+                    zeroconf=zc,
                     service_type=self.type,
                     name=name,
                     state_change=state_change,
@@ -1300,38 +1409,123 @@ class ServiceBrowser(threading.Thread):
 
             expires = record.get_expiration_time(75)
             if expires < self.next_time:
-                self.next_time = expires
+                self.schedule(expires)
+
+    def schedule(self, when):
+        """Schedules the next query at the given time"""
+        if self.timer:
+            self.timer.cancel()
+        self.next_time = when
+        self.timer = self.zc.engine.call_later(
+            when - current_time_millis(), self.send_query)
 
     def cancel(self):
         self.done = True
+        if self.timer:
+            self.timer.cancel()
         self.zc.remove_listener(self)
-        self.join()
 
-    def run(self):
+    def start(self):
+        if self.zc.done or self.done:
+            return
         self.zc.add_listener(self, DNSQuestion(
             self.type, _TYPE_PTR, _CLASS_IN))
+        self.send_query()
 
-        while True:
-            now = current_time_millis()
-            if len(self._handlers_to_call) == 0 and self.next_time > now:
-                self.zc.wait(self.next_time - now)
-            if self.zc.done or self.done:
-                return
-            now = current_time_millis()
-            if self.next_time <= now:
-                out = DNSOutgoing(_FLAGS_QR_QUERY)
-                out.add_question(DNSQuestion(self.type, _TYPE_PTR, _CLASS_IN))
-                for record in self.services.values():
-                    if not record.is_expired(now):
-                        out.add_answer_at_time(record, now)
+    def send_query(self):
+        if self.zc.done or self.done:
+            return
+        now = current_time_millis()
+        out = DNSOutgoing(_FLAGS_QR_QUERY)
+        out.add_question(DNSQuestion(self.type, _TYPE_PTR, _CLASS_IN))
+        for record in self.services.values():
+            if not record.is_expired(now):
+                out.add_answer_at_time(record, now)
+
+        self.zc.send(out)
+        self.schedule(now + self.delay)
+        self.delay = min(20 * 1000, self.delay * 2)
 
-                self.zc.send(out)
-                self.next_time = now + self.delay
-                self.delay = min(20 * 1000, self.delay * 2)
 
-            if len(self._handlers_to_call) > 0 and not self.zc.done:
-                handler = self._handlers_to_call.pop(0)
-                handler(self.zc)
+class ServiceResolver(object):
+
+    """Requests the information of a service without block, the
+    queries are sent from the engine thread and the callback is called
+    (in the engine thread) with the ServiceInfo, or None if the service
+    didn't answer before the timeout."""
+
+    def __init__(self, zc, info, timeout, callback):
+        self.zc = zc
+        self.info = info
+        self.callback = callback
+        self.delay = _LISTENER_TIME
+        self.timer = None
+        self.finished = False
+        self.last = current_time_millis() + timeout
+
+        zc.engine.call_soon(self.start)
+
+    def is_complete(self):
+        return None not in (self.info.server, self.info.address, self.info.text)
+
+    def start(self):
+        now = current_time_millis()
+        for record_type in (_TYPE_SRV, _TYPE_TXT):
+            cached = self.zc.cache.get_by_details(
+                self.info.name, record_type, _CLASS_IN)
+            if cached:
+                self.info.update_record(self.zc, now, cached)
+
+        if self.is_complete():
+            self.finish(True)
+            return
+
+        self.zc.add_listener(
+            self, DNSQuestion(self.info.name, _TYPE_ANY, _CLASS_IN))
+        if not self.finished:
+            self.send_query()
+
+    def update_record(self, zc, now, record):
+        self.info.update_record(zc, now, record)
+        if self.is_complete() and not self.finished:
+            zc.engine.call_soon(lambda: self.finish(True))
+
+    def send_query(self):
+        if self.finished:
+            return
+        now = current_time_millis()
+        if self.zc.done or self.last <= now:
+            self.finish(False)
+            return
+
+        info = self.info
+        out = DNSOutgoing(_FLAGS_QR_QUERY)
+        out.add_question(DNSQuestion(info.name, _TYPE_SRV, _CLASS_IN))
+        out.add_answer_at_time(
+            self.zc.cache.get_by_details(info.name, _TYPE_SRV, _CLASS_IN), now)
+        out.add_question(DNSQuestion(info.name, _TYPE_TXT, _CLASS_IN))
+        out.add_answer_at_time(
+            self.zc.cache.get_by_details(info.name, _TYPE_TXT, _CLASS_IN), now)
+        if info.server is not None:
+            out.add_question(DNSQuestion(info.server, _TYPE_A, _CLASS_IN))
+            out.add_answer_at_time(
+                self.zc.cache.get_by_details(info.server, _TYPE_A, _CLASS_IN),
+                now)
+        self.zc.send(out)
+
+        self.timer = self.zc.engine.call_later(
+            min(self.delay, self.last - now), self.send_query)
+        self.delay *= 2
+
+    def finish(self, found):
+        if self.finished:
+            return
+        self.finished = True
+        if self.timer:
+            self.timer.cancel()
+        if self in self.zc.listeners:
+            self.zc.remove_listener(self)
+        self.callback(self.info if found else None)
 
 
 class ServiceInfo(object):
@@ -1599,7 +1793,8 @@ class Zeroconf(QuietLogger):
         interfaces=InterfaceChoice.All,
     ):
         """Creates an instance of the Zeroconf class, establishing
-        multicast communications, listening and reaping threads.
+        multicast communications and the engine thread, that listens,
+        browses and reaps the cache.
 
         :type interfaces: :class:`InterfaceChoice` or sequence of ip addresses
         """
@@ -1607,7 +1802,8 @@ class Zeroconf(QuietLogger):
         self._GLOBAL_DONE = False
 
         self._listen_socket = new_socket()
-        interfaces = normalize_interface_choice()
+        if not isinstance(interfaces, (list, tuple)):
+            interfaces = normalize_interface_choice()
 
         self._respond_sockets = []
 
@@ -1677,6 +1873,13 @@ class Zeroconf(QuietLogger):
         if info.request(self, timeout):
             return info
 
+    def request_service_info(self, type_, name, callback, timeout=3000):
+        """Requests the network's service information for a particular
+        name and type without block. The callback is called from the
+        engine thread with the ServiceInfo, or None if no service
+        matches by the timeout."""
+        ServiceResolver(self, ServiceInfo(type_, name), timeout, callback)
+
     def add_service_listener(self, type_, listener):
         """Adds a listener for a particular service type.  This object
         will then have its update_record method called when information
@@ -1868,11 +2071,11 @@ class Zeroconf(QuietLogger):
 
             # shutdown recv socket and thread
             self.engine.del_reader(self._listen_socket)
+            if threading.current_thread() is not self.engine:
+                self.engine.join()
             self._listen_socket.close()
-            self.engine.join()
 
             # shutdown the rest
             self.notify_all()
-            self.reaper.join()
             for s in self._respond_sockets:
                 s.close()
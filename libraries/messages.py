@@ -28,12 +28,15 @@
 import sublime
 import sublime_plugin
 
+import time
+import codecs
 import collections
 import threading
 
 from .paths import getPluginName
 from .tools import findInOpendView, get_setting
 from .I18n import I18n
+from .console_log import get_console_log
 
 global session
 
@@ -41,16 +44,28 @@ session = {}
 close_panel = False
 viewer_name = 'Deviot Viewer'
 
+# milliseconds between two console updates
+FRAME_TIME = 16
+# default milliseconds the console can use to print in each update
+FRAME_BUDGET = 8
+# max characters appended to the console at once
+MAX_APPEND_SIZE = 2 ** 16
+# lines kept in the console view when auto clean is enabled
+MAX_LINES = 20000
+# lines removed at once when the console is full
+TRIM_LINES = 1000
+
 
 class Messages:
     port = None
     window = None
-    text_queue = collections.deque()
-    text_queue_lock = threading.Lock()
 
     def __init__(self, output_view=None):
         self.translate = I18n().translate
         self.output_view = output_view
+        self.channel = OutputChannel(self)
+        self.decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        self.log = None
         self._init_text = None
         self._name = None        
 
@@ -88,12 +103,19 @@ class Messages:
         if(not self.output_view and not self.recover_panel(self._name)):
             self.select_output(in_file, direction)
 
+        # text printed before the view existed
+        if(self.channel.size):
+            multiplexer.notify(self.channel)
+
         if(not in_file):
             self.window.run_command("show_panel", {"panel": "output.deviot"})
 
         # change focus to the panel
         self.set_focus()
 
+        # full history of the console in disk
+        self.log = get_console_log(self._name or 'Deviot')
+
         # print initial message
         if(self._init_text):
             self.print(self._init_text)
@@ -135,70 +157,109 @@ class Messages:
 
     def print(self, text, *args):
         """
-        Adds the string in the deque list
+        Adds the string in the output channel of this instance
         """
         # translate strings before append
         text = I18n().translate(text, *args)
 
-        self.text_queue_lock.acquire()
-        try:
-            if(type(text) == bytes):
-                text = text.decode('utf-8')
-            self.text_queue.append(text)
-        finally:
-            self.text_queue_lock.release()
+        if(type(text) == bytes):
+            text = text.decode('utf-8')
 
-        sublime.set_timeout(self.service_text_queue, 0)
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
 
-    def service_text_queue(self):
-        """
-        Handles the deque list to print the messages
+        # fix only end of lines
+        if('\\n' in text[-2:]):
+            text = text.replace('\\n', '\n')
+
+        if(self.log):
+            self.log.write(text)
+
+        self.channel.write(text)
+
+    def print_raw(self, data):
+        """Print raw data
+        
+        Prints the output of a process or a device as it is, without
+        translate it. Use print for the messages of the plugin.
+        bytes, bytearray and memoryview objects are decoded as utf-8,
+        a character split between two calls is decoded complete
+        
+        Arguments:
+            data {str/bytes/memoryview} -- data to print
         """
-        self.text_queue_lock.acquire()
+        if(not isinstance(data, str)):
+            data = self.decoder.decode(data)
 
-        is_empty = False
-        try:
-            if(len(self.text_queue) == 0):
-                return
+        if('\r' in data):
+            data = data.replace('\r\n', '\n').replace('\r', '\n')
 
-            characters = self.text_queue.popleft()
-            is_empty = (len(self.text_queue) == 0)
+        if(not data):
+            return
 
-            self.send_to_file(characters)
+        if(self.log):
+            self.log.write(data)
 
-        finally:
-            self.text_queue_lock.release()
+        self.channel.write(data)
 
-        if(not is_empty):
-            sublime.set_timeout(self.service_text_queue, 1)
+    def backlog(self):
+        """Backlog
+        
+        Number of characters waiting to be printed in the console
+        
+        Returns:
+            int -- size of the text pending
+        """
+        return self.channel.size
+
+    def show_backlog(self, backlog):
+        """Show backlog
+        
+        Shows in the status bar of the console the number of characters
+        waiting to be printed, only when it's bigger than a frame
+        
+        Arguments:
+            backlog {int} -- characters pending
+        """
+        if(not self.output_view):
+            return
+
+        if(backlog > MAX_APPEND_SIZE):
+            kbytes = '{0} KB'.format(backlog // 1024)
+            self.output_view.set_status('_deviot_backlog', I18n().translate('console_backlog_{0}', kbytes))
+        else:
+            self.output_view.erase_status('_deviot_backlog')
 
     def send_to_file(self, text):
         """
         Prints the text in the window
         """
 
-        # Cleans output at the 2000 lines, and when auto clean is activated
-        size = self.output_view.size()
-        auto_clean = get_setting('auto_clean', True)
-
-        if(auto_clean and size > 80 * 20000): # 20000 lines of 80 charactes
-            self.clean_view()
-
-        # append text
-        text = text.replace('\r\n', '\n'). replace('\r', '\n')
-
-        # fix only end of lines
-        if('\\n' in text[-2:]):
-            text = text.replace('\\n', '\n')
-
         self.output_view.run_command('append', {'characters': text, "force": True})
 
+        # keep only the last lines, when auto clean is activated
+        auto_clean = get_setting('auto_clean', True)
+        if(auto_clean):
+            self.trim_view()
+
         # check automatic scroll option
         automatic_scroll = get_setting('automatic_scroll', True)
         if(len(self.output_view.sel()) > 0 and automatic_scroll or not self._name):
-            line = self.output_view.rowcol(size)[0] + 1
+            line = self.output_view.rowcol(self.output_view.size())[0] + 1
             self.output_view.run_command("goto_line", {"line": line})
 
+    def trim_view(self):
+        """Trim view
+        
+        Removes the oldest lines of the view when it has more lines than
+        the allowed in the 'console_max_lines' option. The lines are
+        removed in blocks of TRIM_LINES to not trim on each update
+        """
+        max_lines = get_setting('console_max_lines', MAX_LINES)
+        lines = self.output_view.rowcol(self.output_view.size())[0] + 1
+
+        if(lines > max_lines + TRIM_LINES):
+            self.output_view.run_command('deviot_trim_view', {'lines': lines - max_lines})
+
     def clean_view(self):
         """Clean message view
         
@@ -267,6 +328,141 @@ class Messages:
             self.window.run_command("destroy_pane", args={"direction": "self"})
             self.window = None
 
+class OutputChannel(object):
+    """
+    Text waiting to be printed in the view of a Messages instance. Each
+    instance has its own channel, so the text of different consoles can't
+    be mixed
+    """
+
+    def __init__(self, messages):
+        self.messages = messages
+        self.queue = collections.deque()
+        self.lock = threading.Lock()
+        self.size = 0
+        self.ready = False
+
+    def write(self, text):
+        """Write
+
+        Adds text to the channel and notifies to the multiplexer
+
+        Arguments:
+            text {str} -- text to print
+        """
+        with self.lock:
+            self.queue.append(text)
+            self.size += len(text)
+
+        multiplexer.notify(self)
+
+    def read(self, max_size):
+        """Read
+
+        Takes the text pending, joined in a single string
+
+        Arguments:
+            max_size {int} -- characters to take, it can be exceeded
+                              by the last string taken
+
+        Returns:
+            tuple -- (text, characters left in the channel)
+        """
+        chunks = []
+        size = 0
+
+        with self.lock:
+            while(self.queue and size < max_size):
+                chunk = self.queue.popleft()
+                chunks.append(chunk)
+                size += len(chunk)
+
+            self.size -= size
+            left = self.size
+
+        return (''.join(chunks), left)
+
+
+class ChannelMultiplexer(object):
+    """
+    Prints the text of all the output channels from the UI thread. The
+    channels with text are serviced in turns, each turn appends one
+    batch of text, until there is nothing left or the frame budget
+    is exhausted
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.ready = collections.deque()
+        self.scheduled = False
+
+    def notify(self, channel):
+        """Notify
+
+        Marks a channel as ready to be printed and schedules the service
+
+        Arguments:
+            channel {OutputChannel} -- channel with new text
+        """
+        with self.lock:
+            if(not channel.ready):
+                channel.ready = True
+                self.ready.append(channel)
+
+            if(self.scheduled):
+                return
+            self.scheduled = True
+
+        sublime.set_timeout(self.service, 0)
+
+    def service(self):
+        """Service
+
+        Prints the text of the ready channels, it runs in the UI thread
+        """
+        budget = get_setting('console_frame_budget', FRAME_BUDGET) / 1000.0
+        start = time.time()
+
+        while True:
+            with self.lock:
+                if(not self.ready):
+                    self.scheduled = False
+                    return
+
+                channel = self.ready.popleft()
+                channel.ready = False
+
+            messages = channel.messages
+
+            # the text is kept until the view is created
+            if(not messages.output_view):
+                continue
+
+            text, left = channel.read(MAX_APPEND_SIZE)
+
+            if(text):
+                messages.send_to_file(text)
+                messages.show_backlog(left)
+
+            with self.lock:
+                # back to the end of the line
+                if(left and not channel.ready):
+                    channel.ready = True
+                    self.ready.append(channel)
+
+                # continue in the next frame
+                if(time.time() - start > budget):
+                    if(not self.ready):
+                        self.scheduled = False
+                        return
+                    break
+
+        sublime.set_timeout(self.service, FRAME_TIME)
+
+
+multiplexer = ChannelMultiplexer()
+
+
 def check_empty_panel(window):
     """
     If there is an empty panel will make it active
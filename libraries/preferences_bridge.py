@@ -118,18 +118,22 @@ class PreferencesBridge(PioBridge):
             if(board['id'] == environment):
                 return board['platform'].lower()
 
-    def get_ports_list(self):
+    def get_ports_list(self, check=False):
         """Ports List
         
         Get the list of serial port and mdns services and return it
         
+        Keyword Arguments:
+            check {bool} -- probe the reachability of the mdns services
+                            (default: {False})
+
         Returns:
             list -- serial ports / mdns services
         """
         from .serial import serial_port_list
 
         ports_list = serial_port_list()
-        services = self.get_mdns_services()
+        services = self.get_mdns_services(check)
 
         ports_list.extend(services)
 
@@ -327,21 +331,22 @@ class PreferencesBridge(PioBridge):
             with open(ini_path, 'w') as configfile:
                 config.write(configfile)
 
-    def get_mdns_services(self):
+    def get_mdns_services(self, check=False):
         """mDNS services
         
         Returns the list of instances found in the multicast dns
         (local network)
         
+        Keyword Arguments:
+            check {bool} -- probe the devices and sort them by their
+                            round trip time (default: {False})
+
         Returns:
             list -- device info
         """
-        from .mdns.mdns import MDNSBrowser
-
-        MDNS = MDNSBrowser()
-        MDNS.start()
+        from .mdns.mdns import mdns_browser
 
-        return MDNS.formated_list()
+        return mdns_browser.formated_list(check)
 
     def set_status_information(self):
         """Status bar Information
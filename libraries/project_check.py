@@ -249,10 +249,10 @@ class ProjectCheck(QuickMenu):
         """Check monitor serial
         
         Checks if the monitor serial is currently running
-        and close it.
+        and park it (the port is released but the console is kept).
 
         It will also stores a reference in the preferences (last_action)
-        to run the serial monitor next time
+        to reattach the serial monitor after the upload
         """
         from . import serial
         from .tools import save_setting
@@ -260,10 +260,10 @@ class ProjectCheck(QuickMenu):
         port_id = self.port_id
 
         if(port_id in serial.serials_in_use):
-            serial_monitor = serial.get_serial_monitor(port_id)
+            serial_monitor = serial.serial_monitor_dict.get(port_id, None)
 
-            serial_monitor.stop()
-            del serial.serial_monitor_dict[port_id]
+            if(serial_monitor):
+                serial_monitor.park()
 
             save_setting('run_monitor', True)
 
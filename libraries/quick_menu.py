@@ -242,7 +242,7 @@ class QuickMenu(PreferencesBridge):
         """
         index = 2
         header = self.translate("port_list").upper()
-        ports_list = self.get_ports_list()
+        ports_list = self.get_ports_list(check=True)
         ports_list.insert(0, [header, self.translate("select_port_list")])
         ports_list.insert(1, [self.translate("menu_add_ip"), self.translate("add_ip_subtitle")])
         ports_list.insert(2, [self.translate("menu_not_used_port"), self.translate("not_used_subtitle")])
@@ -494,7 +494,7 @@ class QuickMenu(PreferencesBridge):
         
         List of display modes
         """
-        items = [["Text"],["ASCII"],["HEX"],["Mix"]]
+        items = [["Text"],["ASCII"],["HEX"],["Mix"],["Plot"]]
 
         current = get_setting('display_mode', 'Text')
         self.index = items.index([current])
@@ -515,6 +515,11 @@ class QuickMenu(PreferencesBridge):
         selected = self.quick_list[selected][0]
         save_setting('display_mode', selected)
 
+        # running monitors keep the mode of when they started
+        from .serial import serial_monitor_dict
+        for serial_monitor in list(serial_monitor_dict.values()):
+            serial_monitor.set_display_mode(selected)
+
     @staticmethod
     def baudrate_list():
         """Baudrate list
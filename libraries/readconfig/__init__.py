@@ -33,11 +33,90 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import re
-from os import path
+import threading
+from os import path, stat
 from collections import OrderedDict
 
 ENCODING = 'latin-1'
 
+
+class ParseCache(object):
+    """
+    Files already parsed, shared by all the ReadConfig instances.
+
+    Each entry is keyed by the path of the file and stores the size and
+    modification time it had when it was parsed, the entry is used only
+    while they don't change. The parsed data is stored as a snapshot
+    that is never modified, each instance receives its own copy.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, filepath):
+        return path.normcase(path.abspath(filepath))
+
+    def get(self, filepath, signature):
+        """
+        Returns the snapshot of the file if it has the given signature
+        (mtime, size), None if it must be parsed
+        """
+        with self._lock:
+            entry = self._entries.get(self.key(filepath))
+            if(entry and entry[0] == signature):
+                self.hits += 1
+                return entry[1]
+
+            self.misses += 1
+            return None
+
+    def put(self, filepath, signature, snapshot):
+        with self._lock:
+            self._entries[self.key(filepath)] = (signature, snapshot)
+
+    def invalidate(self, filepath):
+        """
+        Removes the file from the cache (it was written)
+        """
+        with self._lock:
+            self._entries.pop(self.key(filepath), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """
+        Returns a dict with the hits, misses and files in the cache
+        """
+        with self._lock:
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'entries': len(self._entries)}
+
+
+parse_cache = ParseCache()
+
+
+def copy_data(data):
+    """
+    Copies the parsed data, the values are the only mutable objects
+    (lists in an OrderedDict by section)
+    """
+    copy = OrderedDict()
+    for key, value in data.items():
+        if(isinstance(value, OrderedDict)):
+            value = OrderedDict((option, list(values))
+                                for option, values in value.items())
+        copy[key] = value
+    return copy
+
+
 class ReadConfig(object):
     """Configuration file parser.
 
@@ -94,11 +173,51 @@ class ReadConfig(object):
 
     def read(self, filepath):
         """
-        Read the given file (if it exists)
+        Read the given file (if it exists). The file is parsed only if it
+        changed since the last time it was read (by any instance)
         """
-        if(not path.exists(filepath)):
+        try:
+            info = stat(filepath)
+        except OSError:
             return False
 
+        # the cache only stores the result of a file read alone
+        if(self._data or self._sections):
+            return self._parse(filepath)
+
+        signature = (info.st_mtime, info.st_size)
+        snapshot = parse_cache.get(filepath, signature)
+
+        if(snapshot is None):
+            self._parse(filepath)
+            snapshot = self._snapshot()
+            parse_cache.put(filepath, signature, snapshot)
+
+        self._restore(snapshot)
+
+    def _snapshot(self):
+        """
+        Immutable copy of the parsed state
+        """
+        return (copy_data(self._data), tuple(self._sections),
+                self._comment_count, self._break_count, self._cur_sect,
+                self._cur_opt, self._in_option, self._bad_format)
+
+    def _restore(self, snapshot):
+        """
+        Sets the parsed state from a snapshot (it's copied)
+        """
+        (data, sections, self._comment_count, self._break_count,
+         self._cur_sect, self._cur_opt, self._in_option,
+         self._bad_format) = snapshot
+
+        self._data = copy_data(data)
+        self._sections = list(sections)
+
+    def _parse(self, filepath):
+        """
+        Parse the given file
+        """
         with open(filepath, 'rb') as file:
             for line in file:
 
@@ -320,4 +439,10 @@ class ReadConfig(object):
                         new_data += '{0} = {1}\n'.format(key, values[0])
 
         # write in file
-        fileobject.write(new_data)
\ No newline at end of file
+        fileobject.write(new_data)
+
+        # the next read must parse the new content
+        filepath = getattr(fileobject, 'name', None)
+        if(isinstance(filepath, str)):
+            fileobject.flush()
+            parse_cache.invalidate(filepath)
\ No newline at end of file
@@ -6,41 +6,52 @@ from __future__ import print_function
 from __future__ import division
 from __future__ import unicode_literals
 
+import os
+import time
+import codecs
+
+from binascii import hexlify
 from sublime import platform
-from threading import Thread
-from time import sleep
+
+from threading import Thread, Timer, Lock
 
 from . import __version__ as version
-from ..libraries.pyserial.tools import list_ports
 from ..libraries import pyserial
 from .tools import get_setting
 from .messages import Messages
+from .I18n import I18n
+from .serial_reactor import reactor
+from .serial_ports import port_registry, ADDED
+from .serial_capture import new_capture
+from .serial_plotter import Plotter
+from .serial_transfer import FileTransfer
 from . import status_color
 
 def serial_port_list():
     """List of Ports
     
-    Return the list of serial ports availables on the system.
+    Return the list of serial ports availables on the system. The list
+    is cached in the port registry and only enumerated again when the
+    devices change (see serial_ports.PortRegistry)
     
     Returns:
         [list/list] -- list of list like [['port1 fullname', 
                        port_name]['port2 fullname', 'port_name']]
     """
-    ports = list(list_ports.comports())
-    dev_names = ['ttyACM', 'ttyUSB', 'tty.', 'cu.']
-    serial_ports = []
-    for port_no, description, address in ports:
-        for dev_name in dev_names:
-            if(address != 'n/a' and dev_name in port_no or platform() == 'windows'):
-                serial_ports.append([description, address, port_no])
-                break
-
-    return serial_ports
+    return port_registry.ports()
 
 
 serials_in_use = []
 serial_monitor_dict = {}
 
+# seconds waiting for the port after an upload
+REATTACH_TIMEOUT = 30
+# seconds between each check of the devices while a monitor is parked,
+# the boot output of the board must not be lost
+REATTACH_POLL = 0.02
+# seconds after a reattach when a port error means the board is
+# still re-enumerating
+REATTACH_GRACE = 5
 
 class SerialMonitor(object):
     """
@@ -52,7 +63,17 @@ class SerialMonitor(object):
         self.serial = pyserial.Serial()
         self.serial.port = serial_port
         self.is_alive = False
+        self.parked = False
+        self.reattach_time = None
+        self.reattach_start = None
+        self.reattach_timer = None
+        self.reattach_lock = Lock()
         self.baudrate = get_setting('baudrate', 9600)
+        self.formatter = DisplayFormatter()
+        self.capture = None
+        self.plotter = None
+        self.transfer = None
+        self.receiver = None
 
         output_console = get_setting('output_console', False)
         direction = get_setting('monitor_direction', 'right')
@@ -62,6 +83,7 @@ class SerialMonitor(object):
         messages.create_panel(direction=direction, in_file=not output_console)
 
         self.dprint = messages.print
+        self.dprint_raw = messages.print_raw
         self.clean = messages.clean_view
 
     def is_running(self):
@@ -86,30 +108,199 @@ class SerialMonitor(object):
     def start(self):
         """Start serial monitor
         
-        Starts to receive data from the serial monitor in a new thread.
-
+        Opens the serial port and registers it in the serial reactor,
+        who will read the data received (see on_data)
         """
         if(not self.is_alive):
             self.serial.baudrate = self.baudrate
+            self.set_display_mode(get_setting('display_mode', 'Text'))
             
-            if is_available(self.port):
-                self.serial.open()
-                self.is_alive = True
-                
-                monitor_thread = Thread(target=self.receive)
-                monitor_thread.start()
-            else:
+            if(not is_available(self.port)):
+                self.stop()
+                return
+
+            if(not self.open_port()):
+                status_color.set("error", 3000)
                 self.stop()
 
+    def open_port(self):
+        """Open port
+        
+        Opens the serial port and registers it in the serial reactor
+        
+        Returns:
+            bool -- False if the port couldn't be opened
+        """
+        # the port is open only once, a second process trying to
+        # lock it will fail
+        self.serial.exclusive = True
+
+        try:
+            self.serial.open()
+        except (pyserial.SerialException, OSError):
+            return False
+
+        if(not self.capture and get_setting('serial_capture', False)):
+            self.capture = new_capture(self.port)
+
+        self.is_alive = True
+        self.parked = False
+        reactor.add(self)
+
+        return True
+
     def stop(self):
         """Stop serial monitor
         
         Stops the loop who is wating for more information from the serial port
         """
         self.is_alive = False
+        self.parked = False
+        self.end_reattach()
         if(self.port in serials_in_use):
             serials_in_use.remove(self.port)
 
+        # the port is closed by the reactor
+        reactor.remove(self)
+
+        if(self.capture):
+            self.capture.close()
+            self.capture = None
+
+        if(self.plotter):
+            self.plotter.close()
+            self.plotter = None
+
+        if(self.transfer):
+            self.transfer.cancel()
+
+    def park(self):
+        """Park monitor
+        
+        Releases the serial port (to upload a sketch) but keeps the
+        console, the capture and the plotter, so the monitor can be
+        reattached later with the same output
+        """
+        self.parked = True
+        self.is_alive = False
+
+        # the reactor closes the current object, the port will be
+        # opened again with a new one
+        reactor.remove(self)
+
+        serial = pyserial.Serial()
+        serial.port = self.port
+        serial.baudrate = self.baudrate
+        self.serial = serial
+
+    def reattach(self):
+        """Reattach monitor
+        
+        Opens again the port of a parked monitor. When the port isn't back
+        yet (the board can re-enumerate after the upload) it's opened as
+        soon as the port registry reports it added, so the boot output of
+        the device isn't lost. The registry checks the devices every
+        REATTACH_POLL seconds while the monitor waits. The monitor is
+        stopped if the port isn't back in REATTACH_TIMEOUT seconds
+        """
+        self.reattach_start = time.time()
+        port_registry.subscribe(self.on_port_change, REATTACH_POLL)
+
+        self.reattach_timer = Timer(REATTACH_TIMEOUT, self.reattach_timeout)
+        self.reattach_timer.daemon = True
+        self.reattach_timer.start()
+
+        monitor_thread = Thread(target=self.wait_port)
+        monitor_thread.start()
+
+    def wait_port(self):
+        """Wait port
+        
+        Opens the port if it's already in the list, otherwise the ADDED
+        event of the port registry will do it
+        """
+        if(self.port in port_registry.port_names()):
+            self.open_parked()
+
+    def on_port_change(self, event, port):
+        """Port change
+        
+        Called by the port registry (from its polling thread) when a port
+        is added or removed
+        
+        Arguments:
+            event {str} -- ADDED or REMOVED
+            port {str} -- port name
+        """
+        if(event == ADDED and port == self.port):
+            self.open_parked()
+
+    def open_parked(self):
+        """Open parked monitor
+        
+        Checks once if the port is free and opens it
+        
+        Returns:
+            bool -- True if the monitor is running
+        """
+        with self.reattach_lock:
+            if(not self.parked):
+                return self.is_alive
+
+            if(not is_available(self.port) or not self.open_port()):
+                return False
+
+        self.end_reattach()
+        self.reattach_time = time.time()
+
+        elapsed = int((self.reattach_time - self.reattach_start) * 1000)
+        self.dprint('serial_reattached_{0}', elapsed)
+        return True
+
+    def reattach_timeout(self):
+        """Reattach timeout
+        
+        The port wasn't back in REATTACH_TIMEOUT seconds
+        """
+        with self.reattach_lock:
+            if(not self.parked):
+                return
+            self.parked = False
+
+        status_color.set("error", 3000)
+        self.dprint('serial_not_available')
+        self.stop()
+
+    def end_reattach(self):
+        """End reattach
+        
+        Stops listening the port registry and cancels the timeout
+        """
+        port_registry.unsubscribe(self.on_port_change)
+
+        timer = self.reattach_timer
+        self.reattach_timer = None
+        if(timer):
+            timer.cancel()
+
+    def set_display_mode(self, mode):
+        """Display mode
+        
+        Changes the format used to show the data received. In the Plot
+        mode the data is shown as text and the numbers are plotted
+        
+        Arguments:
+            mode {str} -- Text, ASCII, HEX, Mix or Plot
+        """
+        self.formatter = DisplayFormatter(mode)
+
+        if(mode == 'Plot' and not self.plotter):
+            title = I18n().translate('plotter_header{0}', self.port)
+            self.plotter = Plotter(title)
+        elif(mode != 'Plot' and self.plotter):
+            self.plotter.close()
+            self.plotter = None
+
     def clean_console(self):
         """Clean console
         
@@ -117,34 +308,49 @@ class SerialMonitor(object):
         """
         self.clean()
 
-    def receive(self):
-        """Receive Data
+    def on_data(self, data):
+        """Data received
         
-        The loops will run until is_alive is true. After receive the serial data
-        it can be converted to the mode selected by the user (ascii, hex, etc)
+        Called by the serial reactor with the data received. The data is
+        stored in the capture file (if it's enabled). While a file transfer
+        is running it only goes to the transfer, otherwise it's sent to the
+        plotter (Plot mode) and printed in the mode selected by the user
+        
+        Arguments:
+            data {bytes} -- data received
         """
-        length_before = 0
+        capture = self.capture
+        if(capture):
+            capture.write(data)
 
-        while self.is_alive:
-            try:
-                buf_number = self.serial.inWaiting()
-            except:
-                status_color.set("error", 3000)
-                self.stop()
+        # a file transfer is waiting for the answers of the device
+        receiver = self.receiver
+        if(receiver):
+            receiver(data)
+            return
 
-            if(buf_number > 0):
-                inp_text = self.serial.read(buf_number)
-                length_in_text = len(inp_text)
-                inp_text = display_mode(inp_text, length_before)
-                
-                self.dprint(inp_text)
-                
-                length_before += length_in_text
-                length_before %= 16
-            
-            sleep(0.04)
+        plotter = self.plotter
+        if(plotter):
+            plotter.feed(data)
+
+        self.dprint_raw(self.formatter.format(data))
+
+    def on_error(self):
+        """Port error
         
-        self.serial.close()
+        Called by the serial reactor when the port can't be read
+        (usually the device was unplugged). If it happens just after a
+        reattach, the board is still re-enumerating, so the monitor waits
+        for the port again
+        """
+        if(self.reattach_time and time.time() - self.reattach_time < REATTACH_GRACE):
+            self.reattach_time = None
+            self.park()
+            self.reattach()
+            return
+
+        status_color.set("error", 3000)
+        self.stop()
 
     def send(self, out_text):
         """Send text
@@ -163,11 +369,48 @@ class SerialMonitor(object):
         out_text = out_text.encode('utf-8', 'replace')
         self.serial.write(out_text)
 
+    def send_file(self, file_path, protocol):
+        """Send file
+        
+        Sends a file to the device in a new thread, the size of the
+        chunks, the pause between them and the flow control are taken
+        from the preferences
+        
+        Arguments:
+            file_path {str} -- path of the file
+            protocol {str} -- Raw, XMODEM, XMODEM-1K or YMODEM
+        
+        Returns:
+            bool -- False if there is other transfer running
+        """
+        if(self.transfer and self.transfer.is_running()):
+            return False
+
+        chunk_size = get_setting('transfer_chunk_size', 256)
+        pacing = get_setting('transfer_pacing', 0)
+        flow_control = get_setting('transfer_flow_control', 'none')
+
+        self.transfer = FileTransfer(self, file_path, protocol, chunk_size,
+                                     pacing, flow_control)
+        self.transfer.start()
+
+        return True
+
+
+# folders where the UUCP style lock files (LCK..ttyUSB0) are created
+LOCK_DIRS = ['/var/lock', '/var/run/lock', '/var/spool/lock', '/tmp']
+
 
 def is_available(serial_port):
     """Port available
     
-    Checks if the serial port is available.
+    Checks if the serial port is available without opening it (open the
+    port toggles DTR and resets most of the Arduino boards). The port is
+    busy when a serial monitor of Deviot is reading it, when there is a
+    lock file for it or (in Linux) when other process has it open.
+
+    In Windows there is no way to know it without open the port, the
+    open of the monitor will fail if it's busy.
 
     Arguments:
         serial_port {str} -- Port name to check
@@ -175,82 +418,254 @@ def is_available(serial_port):
     Returns:
         [bool] -- True when the port is available False if not
     """
-    state = False
-    serial = pyserial.Serial()
-    serial.port = serial_port
+    if(serial_port in reactor.ports()):
+        return False
+
+    if(platform() == 'windows'):
+        return True
+
+    return not port_locked(serial_port) and not port_opened(serial_port)
+
+
+def port_locked(serial_port):
+    """Port Locked
     
-    try:
-        serial.open()
-    except pyserial.serialutil.SerialException:
-        pass
-    except UnicodeDecodeError:
-        pass
-    else:
-        if serial.isOpen():
-            state = True
-            serial.close()
+    Searches a lock file of the port created by a running process,
+    the lock files of processes already finished are ignored
     
-    return state
-
-def display_mode(inp_text, str_len=0):
+    Arguments:
+        serial_port {str} -- Port name to check
+    
+    Returns:
+        bool -- True if there is a valid lock file
     """
-    Convert a text in differents formats (ASCII,HEX)
+    lock_name = 'LCK..' + os.path.basename(serial_port)
 
-    Arguments:
-        inp_text {string}
-            Text to convert
+    for lock_dir in LOCK_DIRS:
+        lock_path = os.path.join(lock_dir, lock_name)
+
+        try:
+            with open(lock_path, 'rb') as file:
+                content = file.read(64)
+        except (IOError, OSError):
+            continue
+
+        # the pid can be stored as text or as a binary int
+        try:
+            pid = int(content.strip() or 0)
+        except ValueError:
+            pid = int.from_bytes(content[:4], 'little')
 
-    Keyword Arguments:
-        str_len {int}
-            leng of the inp_text string (default: {0})
+        if(not pid):
+            return True
 
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            continue
+        except OSError:
+            # the process exists but belongs to other user
+            pass
+
+        return True
+
+    return False
+
+
+def port_opened(serial_port):
+    """Port Opened
+    
+    Searches the port in the file descriptors of all the processes
+    (/proc/<pid>/fd). Only available in Linux, False is returned in
+    other systems
+    
+    Arguments:
+        serial_port {str} -- Port name to check
+    
     Returns:
-        [string] -- Converted string
+        bool -- True if a process has the port open
     """
-    text = u''
-    display_mode = get_setting("display_mode", 'Text')
+    if(not os.path.isdir('/proc/self/fd')):
+        return False
+
+    device = os.path.realpath(serial_port)
+
+    for pid in os.listdir('/proc'):
+        if(not pid.isdigit()):
+            continue
+
+        fd_dir = os.path.join('/proc', pid, 'fd')
+        try:
+            fds = os.listdir(fd_dir)
+        except OSError:
+            continue
+
+        for fd in fds:
+            try:
+                if(os.readlink(os.path.join(fd_dir, fd)) == device):
+                    return True
+            except OSError:
+                pass
+
+    return False
+
+# characters shown in the ascii column of the Mix mode, the control
+# characters are replaced to keep the columns aligned
+MIX_TABLE = bytes(bytearray(value if 32 <= value < 127 else ord('.')
+                            for value in range(256)))
+
+
+def hex_string(data):
+    """HEX string
     
-    if display_mode == 'ASCII':
-        for character in inp_text:
-            text += chr(character)
+    Converts the data in a string with the hexadecimal value of each byte
+    followed by a space 'XX XX XX '. The conversion is made by hexlify
+    and slices, without a python loop over each byte
     
-    elif display_mode == 'HEX':
-        for (index, character) in enumerate(inp_text):
-            text += u'%02X ' % character
-            if (index + str_len + 1) % 8 == 0:
-                text += '\t'
-            if (index + str_len + 1) % 16 == 0:
-                text += '\n'
+    Arguments:
+        data {bytes} -- data to convert
     
-    elif display_mode == 'Mix':
-        text_mix = u''
-        for (index, character) in enumerate(inp_text):
-            text_mix += chr(character)
-            text += u'%02X ' % character
-            
-            if (index + str_len + 1) % 8 == 0:
-                text += '\t'
-            
-            if (index + str_len + 1) % 16 == 0:
-                text_mix = text_mix.replace('\n', '+')
-                text += text_mix
-                text += '\n'
-                text_mix = ''
-        
-        if(text_mix):
-            less = (31 - index)
-            for sp in range(less):
-                text += '   '
-            text += '\t'
-            text += text_mix
+    Returns:
+        str -- hexadecimal string
+    """
+    hexa = hexlify(data).upper()
+    text = bytearray(b' ' * (len(data) * 3))
+    text[0::3] = hexa[0::2]
+    text[1::3] = hexa[1::2]
 
-    else:
-        text = inp_text.decode('utf-8', 'replace')
-        text = text.replace('\r', '')
+    return text.decode('ascii')
+
+
+def blank_columns(start, end):
+    """Blank columns
+    
+    Spaces to fill the HEX columns from start to end (0 to 16),
+    including the tabs between the blocks of 8 bytes
     
+    Arguments:
+        start {int} -- first column
+        end {int} -- last column (not included)
+    
+    Returns:
+        str -- spaces and tabs
+    """
+    text = ''
+    for column in range(start, end):
+        text += '   '
+        if((column + 1) % 8 == 0):
+            text += '\t'
     return text
 
 
+class DisplayFormatter(object):
+    """
+    Converts the data received in the display mode selected by the user
+    (Text, ASCII, HEX or Mix, the Plot mode is shown as Text). The position
+    in the row of 16 bytes is kept between chunks, so the columns stay
+    aligned
+    """
+
+    def __init__(self, mode='Text'):
+        self.mode = mode
+        self.column = 0
+        self.decoder = codecs.getincrementaldecoder('utf-8')('replace')
+
+    def format(self, data):
+        """Format
+        
+        Arguments:
+            data {bytes} -- data received
+        
+        Returns:
+            str -- data converted
+        """
+        if(self.mode == 'ASCII'):
+            return data.decode('latin-1')
+
+        if(self.mode == 'HEX'):
+            return self.format_hex(data)
+
+        if(self.mode == 'Mix'):
+            return self.format_mix(data)
+
+        text = self.decoder.decode(data)
+        return text.replace('\r', '')
+
+    def format_hex(self, data, ascii_column=None):
+        """HEX format
+        
+        Converts the data in blocks of 8 bytes, separated by a tab, and
+        rows of 16 bytes
+        
+        Arguments:
+            data {bytes} -- data received
+        
+        Keyword Arguments:
+            ascii_column {list} -- when is given, the text of each row is
+                                   added at the end of it (default: {None})
+        
+        Returns:
+            str -- data converted
+        """
+        text = []
+        position = 0
+        length = len(data)
+        column = self.column
+        hexa = hex_string(data)
+
+        while(position < length):
+            size = min(8 - column % 8, length - position)
+
+            text.append(hexa[position * 3:(position + size) * 3])
+            if(ascii_column is not None):
+                block = data[position:position + size]
+                ascii_column.append(block.translate(MIX_TABLE).decode('latin-1'))
+
+            position += size
+            column += size
+
+            if(column % 8 == 0):
+                text.append('\t')
+
+            if(column == 16):
+                if(ascii_column is not None):
+                    text.extend(ascii_column)
+                    del ascii_column[:]
+                text.append('\n')
+                column = 0
+
+        self.column = column
+
+        return ''.join(text)
+
+    def format_mix(self, data):
+        """Mix format
+        
+        HEX format with the text of each row at the end of it. An incomplete
+        row is printed padded, and it continues in the next chunk in the same
+        columns
+        
+        Arguments:
+            data {bytes} -- data received
+        
+        Returns:
+            str -- data converted
+        """
+        column = self.column
+        ascii_column = [' ' * column]
+        text = [blank_columns(0, column)]
+
+        text.append(self.format_hex(data, ascii_column))
+
+        column = self.column
+        if(column):
+            text.append(blank_columns(column, 16))
+            text.extend(ascii_column)
+            text.append('\n')
+
+        return ''.join(text)
+
+
 def get_serial_monitor(port_id):
     """Get Serial Monitor Object
     
@@ -279,12 +694,40 @@ def get_serial_monitor(port_id):
     return serial_monitor
 
 
+def reattach_serial_monitor(port_id):
+    """Reattach serial monitor
+    
+    Reopens the monitor parked before an upload, if there is no monitor
+    parked in the port, a new one is started
+    
+    Arguments:
+        port_id {str} -- port of the monitor
+    """
+    serial_monitor = serial_monitor_dict.get(port_id, None)
+
+    if(serial_monitor and serial_monitor.parked):
+        status_color.set('success')
+        serial_monitor.reattach()
+        return
+
+    toggle_serial_monitor()
+
+
 def toggle_serial_monitor():
     """Open/Close serial monitor
     
     If the serial monitor is closed, it will be opened or the opposite.
     """
     port_id = get_setting('port_id', None)
+
+    # the port is being used by an upload, it will be opened again
+    # when the upload ends
+    parked = serial_monitor_dict.get(port_id, None)
+    if(parked and parked.parked):
+        status_color.set('error', 3000)
+        parked.dprint('serial_parked')
+        return
+
     serial_monitor = get_serial_monitor(port_id)
 
     if(serial_monitor == False):
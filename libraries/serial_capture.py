@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Raw captures of the serial monitor.
+
+When the serial_capture option is enabled, all the bytes received by a
+monitor are stored (before any conversion) in an append only binary file:
+
+    header: MAGIC (8 bytes) + start time (double, seconds since epoch)
+    chunk:  time (double, seconds since the start) + size (uint32) + data
+
+The time of each chunk is taken from a monotonic clock. The reader maps
+the file in memory and only reads the chunk headers to build the index,
+so a capture of hours can be opened, searched by time and replayed
+without load it entirely.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from __future__ import unicode_literals
+
+import os
+import re
+import time
+import mmap
+import struct
+import threading
+
+from bisect import bisect_left
+
+from .paths import getCacheDir
+
+MAGIC = b'DVCAP\x00\x01\x00'
+FILE_HEADER = struct.Struct('<8sd')
+CHUNK_HEADER = struct.Struct('<dI')
+EXTENSION = '.dvcap'
+
+# seconds between each flush of the capture file
+FLUSH_INTERVAL = 1.0
+
+
+def getCaptureDir():
+    """
+    Folder where the serial captures are stored
+    """
+    capture_dir = os.path.join(getCacheDir(), 'captures')
+
+    if(not os.path.isdir(capture_dir)):
+        os.makedirs(capture_dir)
+
+    return capture_dir
+
+
+def capture_list():
+    """Capture List
+
+    Returns:
+        list -- path of the captures stored, the newest first
+    """
+    capture_dir = getCaptureDir()
+    files = [os.path.join(capture_dir, file)
+             for file in os.listdir(capture_dir) if file.endswith(EXTENSION)]
+
+    return sorted(files, key=os.path.getmtime, reverse=True)
+
+
+def new_capture(serial_port):
+    """New Capture
+
+    Creates a capture file for the given port, named with the port and
+    the current date
+
+    Arguments:
+        serial_port {str} -- port name
+
+    Returns:
+        CaptureWriter -- capture open
+    """
+    port_name = re.sub(r'[^\w\-.]+', '_', os.path.basename(serial_port))
+    date = time.strftime('%Y%m%d-%H%M%S')
+    index = 0
+
+    # a capture started in the same second gets a new file
+    while(True):
+        suffix = '-{0}'.format(index) if index else ''
+        file_name = '{0}_{1}{2}{3}'.format(port_name, date, suffix, EXTENSION)
+
+        try:
+            return CaptureWriter(os.path.join(getCaptureDir(), file_name))
+        except FileExistsError:
+            index += 1
+
+
+class CaptureWriter(object):
+    """
+    Writes the data received to a new capture file, the file must not
+    exist (the times of the chunks are relative to its header)
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = open(path, 'xb')
+        self.start = time.monotonic()
+        self.last_flush = self.start
+
+        self.file.write(FILE_HEADER.pack(MAGIC, time.time()))
+
+    def write(self, data):
+        """Write
+
+        Appends a chunk with the data and the time it was received
+
+        Arguments:
+            data {bytes} -- raw data received
+        """
+        if(not data):
+            return
+
+        now = time.monotonic()
+
+        with self.lock:
+            if(self.file is None):
+                return
+
+            self.file.write(CHUNK_HEADER.pack(now - self.start, len(data)))
+            self.file.write(data)
+
+            if(now - self.last_flush > FLUSH_INTERVAL):
+                self.file.flush()
+                self.last_flush = now
+
+    def close(self):
+        with self.lock:
+            if(self.file):
+                self.file.close()
+                self.file = None
+
+
+class CaptureReader(object):
+    """
+    Random access to the chunks of a capture file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        self.memory = None
+        self.start_time = None
+        self.times = []
+        self.offsets = []
+
+        self.load()
+
+    def load(self):
+        """Load
+
+        Maps the file and builds the index of chunks. An incomplete chunk
+        at the end (capture still running or interrupted) is ignored
+        """
+        size = os.fstat(self.file.fileno()).st_size
+        if(size < FILE_HEADER.size):
+            self.close()
+            raise ValueError('Invalid capture file')
+
+        self.memory = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.start_time = FILE_HEADER.unpack_from(self.memory, 0)
+        if(magic != MAGIC):
+            self.close()
+            raise ValueError('Invalid capture file')
+
+        position = FILE_HEADER.size
+        header_size = CHUNK_HEADER.size
+
+        while(position + header_size <= size):
+            chunk_time, length = CHUNK_HEADER.unpack_from(self.memory, position)
+            if(position + header_size + length > size):
+                break
+
+            self.times.append(chunk_time)
+            self.offsets.append(position)
+            position += header_size + length
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, index):
+        """Chunk
+
+        Arguments:
+            index {int} -- chunk number
+
+        Returns:
+            tuple -- (time since the start, data)
+        """
+        position = self.offsets[index]
+        chunk_time, length = CHUNK_HEADER.unpack_from(self.memory, position)
+        position += CHUNK_HEADER.size
+
+        return (chunk_time, self.memory[position:position + length])
+
+    def duration(self):
+        """
+        Seconds between the first and the last chunk
+        """
+        return self.times[-1] if self.times else 0.0
+
+    def find(self, seconds):
+        """Find by time
+
+        Arguments:
+            seconds {float} -- time since the start of the capture
+
+        Returns:
+            int -- index of the first chunk received after the given time
+        """
+        return bisect_left(self.times, seconds)
+
+    def replay(self, callback, speed=1.0, start=0, stop=None):
+        """Replay
+
+        Sends the chunks to the callback with the same intervals they
+        were received
+
+        Arguments:
+            callback {function} -- called with the data of each chunk
+
+        Keyword Arguments:
+            speed {float} -- 2 is twice the original speed, 0 sends the
+                             chunks without wait (default: {1.0})
+            start {int} -- first chunk (default: {0})
+            stop {Event} -- when it's set the replay ends (default: {None})
+        """
+        if(start >= len(self)):
+            return
+
+        first = self.times[start]
+        begin = time.monotonic()
+
+        for index in range(start, len(self)):
+            if(stop is not None and stop.is_set()):
+                break
+
+            chunk_time, data = self[index]
+
+            if(speed):
+                delay = (chunk_time - first) / speed - (time.monotonic() - begin)
+                if(delay > 0):
+                    time.sleep(delay)
+
+            callback(data)
+
+    def close(self):
+        if(self.memory):
+            self.memory.close()
+            self.memory = None
+        self.file.close()
@@ -0,0 +1,336 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Live plot of the numeric data received by the serial monitor.
+
+In the Plot display mode, each line received is parsed (in the serial
+reader thread) as a list of numbers separated by commas, semicolons,
+tabs or spaces, or as label:value pairs. Each series is stored in a
+ring buffer of fixed size backed by an array of doubles.
+
+At most every REFRESH_TIME seconds, a timer thread decimates the series
+to the width of the view (keeping the min and max of each column, so
+the peaks aren't lost), draws them in a PNG image and builds the HTML.
+The UI thread only has to update a phantom with the HTML already built.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from __future__ import unicode_literals
+
+import re
+import math
+import zlib
+import struct
+import base64
+import threading
+import sublime
+
+from array import array
+from html import escape
+from codecs import getincrementaldecoder
+from collections import OrderedDict
+
+from ..platformio.diagnostics import LineAssembler
+
+# values kept for each series
+BUFFER_SIZE = 4096
+# series plotted at the same time
+MAX_SERIES = 8
+# seconds between renders
+REFRESH_TIME = 0.1
+# size of the image (pixels)
+PLOT_WIDTH = 600
+PLOT_HEIGHT = 200
+MIN_WIDTH = 100
+
+# palette of the image: background, grid and a color by series
+PALETTE = [(0x23, 0x23, 0x23), (0x50, 0x50, 0x50),
+           (0x1F, 0x9B, 0xF0), (0xF0, 0x5B, 0x1F), (0x3C, 0xC8, 0x4B),
+           (0xE8, 0xC5, 0x1B), (0xB0, 0x5C, 0xE6), (0x1B, 0xD6, 0xC8),
+           (0xE6, 0x45, 0x8C), (0xC8, 0xC8, 0xC8)]
+BACKGROUND = 0
+GRID = 1
+FIRST_COLOR = 2
+
+SEPARATORS_RE = re.compile(r'[,;\t ]+')
+
+
+def parse_values(line):
+    """Parse values
+
+    Extracts the numbers of a line. The values can be only numbers
+    '1.5,20,-3' or labeled 'temp:21.5 hum:40'
+
+    Arguments:
+        line {str} -- line received
+
+    Returns:
+        list -- (series name, value) pairs, the name of the unlabeled
+                values is their position
+    """
+    values = []
+
+    for index, token in enumerate(SEPARATORS_RE.split(line.strip())):
+        name, _, token = token.rpartition(':')
+
+        try:
+            value = float(token)
+        except ValueError:
+            continue
+
+        # 'nan' and 'inf' are parsed too, but they can't be plotted
+        if(math.isnan(value) or math.isinf(value)):
+            continue
+
+        values.append((name or str(index + 1), value))
+
+    return values
+
+
+class RingBuffer(object):
+    """
+    Last values of a series, stored in an array of fixed size
+    """
+
+    def __init__(self, size=BUFFER_SIZE):
+        self.data = array('d', bytes(8 * size))
+        self.size = size
+        self.head = 0
+        self.count = 0
+
+    def append(self, value):
+        self.data[self.head] = value
+        self.head = (self.head + 1) % self.size
+        if(self.count < self.size):
+            self.count += 1
+
+    def values(self):
+        """Values
+
+        Returns:
+            array -- values from the oldest to the newest
+        """
+        if(self.count < self.size):
+            return self.data[:self.count]
+        return self.data[self.head:] + self.data[:self.head]
+
+
+def minmax_decimate(values, columns):
+    """Min/Max decimation
+
+    Reduces the values to the given number of columns keeping the min
+    and the max of each one
+
+    Arguments:
+        values {array} -- values of a series
+        columns {int} -- width of the plot
+
+    Returns:
+        list -- (min, max) of each column
+    """
+    length = len(values)
+    columns = min(columns, length)
+    points = []
+
+    for column in range(columns):
+        bucket = values[column * length // columns:(column + 1) * length // columns]
+        points.append((min(bucket), max(bucket)))
+
+    return points
+
+
+def png_image(pixels, width, height):
+    """PNG image
+
+    Encodes an image of 8 bits indexed with PALETTE
+
+    Arguments:
+        pixels {bytearray} -- index of the color of each pixel
+        width {int} -- image width
+        height {int} -- image height
+
+    Returns:
+        bytes -- PNG file
+    """
+    def chunk(kind, data):
+        crc = zlib.crc32(kind + data) & 0xFFFFFFFF
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', crc)
+
+    # each row starts with the filter type (0 none)
+    rows = b''.join(b'\x00' + bytes(pixels[row * width:(row + 1) * width])
+                    for row in range(height))
+    palette = b''.join(struct.pack('BBB', *color) for color in PALETTE)
+
+    return (b'\x89PNG\r\n\x1a\n' +
+            chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 3, 0, 0, 0)) +
+            chunk(b'PLTE', palette) +
+            chunk(b'IDAT', zlib.compress(rows, 1)) +
+            chunk(b'IEND', b''))
+
+
+def draw_plot(series, width, height):
+    """Draw plot
+
+    Draws the series decimated in an image, all the series share the
+    same vertical scale
+
+    Arguments:
+        series {list} -- (name, values) of each series
+        width {int} -- image width
+        height {int} -- image height
+
+    Returns:
+        tuple -- (PNG image, min value, max value)
+    """
+    pixels = bytearray(width * height)
+    decimated = [minmax_decimate(values, width) for name, values in series]
+
+    low = min([point[0] for points in decimated for point in points] or [0.0])
+    high = max([point[1] for points in decimated for point in points] or [0.0])
+    if(high == low):
+        high, low = high + 1, low - 1
+
+    scale = (height - 1) / (high - low)
+
+    def row(value):
+        return height - 1 - int((value - low) * scale)
+
+    # horizontal grid
+    for line in range(1, 4):
+        start = (height * line // 4) * width
+        pixels[start:start + width] = bytes([GRID]) * width
+
+    for index, points in enumerate(decimated):
+        color = bytes([FIRST_COLOR + index % (len(PALETTE) - FIRST_COLOR)])
+        previous = None
+
+        for x, (minimum, maximum) in enumerate(points):
+            top, bottom = row(maximum), row(minimum)
+
+            # join with the previous column
+            if(previous is not None):
+                top = min(top, previous)
+                bottom = max(bottom, previous)
+            previous = row((minimum + maximum) / 2)
+
+            # vertical line in the column x (from top to bottom)
+            pixels[top * width + x:bottom * width + x + 1:width] = color * (bottom - top + 1)
+
+    return (png_image(pixels, width, height), low, high)
+
+
+class Plotter(object):
+    """
+    Plots the numeric lines received by a serial monitor in a view
+    """
+
+    def __init__(self, title):
+        self.title = title
+        self.lock = threading.Lock()
+        self.decoder = getincrementaldecoder('utf-8')('replace')
+        self.assembler = LineAssembler()
+        self.series = OrderedDict()
+        self.width = PLOT_WIDTH
+        self.scheduled = False
+        self.closed = False
+        self.view = None
+        self.phantom_set = None
+
+        sublime.set_timeout(self.create_view, 0)
+
+    def feed(self, data):
+        """Feed data
+
+        Parses the complete lines received and schedules a render, it
+        runs in the serial reader thread
+
+        Arguments:
+            data {bytes} -- data received
+        """
+        text = self.decoder.decode(data).replace('\r', '')
+        updated = False
+
+        with self.lock:
+            for line in self.assembler.feed(text):
+                for name, value in parse_values(line):
+                    if(name not in self.series):
+                        if(len(self.series) >= MAX_SERIES):
+                            continue
+                        self.series[name] = RingBuffer()
+
+                    self.series[name].append(value)
+                    updated = True
+
+            if(not updated or self.scheduled or self.closed):
+                return
+            self.scheduled = True
+
+        timer = threading.Timer(REFRESH_TIME, self.render)
+        timer.daemon = True
+        timer.start()
+
+    def render(self):
+        """Render
+
+        Builds the HTML of the plot (in the timer thread) and sends it
+        to the UI thread
+        """
+        with self.lock:
+            self.scheduled = False
+            series = [(name, buffer.values()) for name, buffer in self.series.items()]
+            width = self.width
+
+        image, low, high = draw_plot(series, width, PLOT_HEIGHT)
+        image = base64.b64encode(image).decode('ascii')
+
+        legend = []
+        for index, (name, values) in enumerate(series):
+            color = '#%02X%02X%02X' % PALETTE[FIRST_COLOR + index % (len(PALETTE) - FIRST_COLOR)]
+            # the names come from the device, they can have html characters
+            legend.append('<span style="color: {0}">&#9632; {1}: {2:g}</span> '.format(
+                color, escape(name), values[-1]))
+
+        content = ('<body id=deviot-plotter><div>' + ''.join(legend) + '</div>' +
+                   '<div>{0:g}</div>'.format(high) +
+                   '<img src="data:image/png;base64,' + image + '" ' +
+                   'width="{0}" height="{1}">'.format(width, PLOT_HEIGHT) +
+                   '<div>{0:g}</div></body>'.format(low))
+
+        sublime.set_timeout(lambda: self.update(content), 0)
+
+    def create_view(self):
+        """
+        Creates the view where the plot is shown (UI thread)
+        """
+        window = sublime.active_window()
+
+        self.view = window.new_file()
+        self.view.set_name(self.title)
+        self.view.set_scratch(True)
+        self.phantom_set = sublime.PhantomSet(self.view, 'deviot_plotter')
+
+    def update(self, content):
+        """Update
+
+        Replaces the phantom with the new plot (UI thread)
+
+        Arguments:
+            content {str} -- HTML of the plot
+        """
+        if(self.closed or not self.view or not self.view.is_valid()):
+            return
+
+        region = sublime.Region(0, 0)
+        self.phantom_set.update([sublime.Phantom(region, content, sublime.LAYOUT_BLOCK)])
+
+        # the next frame is drawn with the width of the view
+        width = int(self.view.viewport_extent()[0]) - 40
+        with self.lock:
+            self.width = max(MIN_WIDTH, min(width, PLOT_WIDTH * 2))
+
+    def close(self):
+        with self.lock:
+            self.closed = True
@@ -0,0 +1,306 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Cached list of the serial ports of the system.
+
+Enumerate the ports with pyserial (list_ports.comports) is slow, in Linux
+it walks sysfs reading several files for each device. The registry keeps
+the last list and only enumerates the ports again when a cheap signature
+of the devices changes: the tty entries in /dev with their inode and
+change time (POSIX) or the values of the SERIALCOMM key in the registry
+(Windows).
+
+Subscribers receive an event when a port is added or removed, while there
+is at least one subscriber a thread checks the signature every
+POLL_INTERVAL seconds, or faster if a subscriber asked for it. A device
+created again with the same name (a board that re-enumerates) is
+reported as removed and added.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from __future__ import unicode_literals
+
+import os
+import threading
+
+from sublime import platform
+
+from ..libraries.pyserial.tools import list_ports
+
+# name of the devices shown as serial ports (POSIX)
+DEV_NAMES = ['ttyACM', 'ttyUSB', 'tty.', 'cu.']
+# seconds between each check of the devices when there are subscribers
+POLL_INTERVAL = 1.0
+
+ADDED = 'added'
+REMOVED = 'removed'
+
+
+def devices_signature():
+    """Devices Signature
+
+    Cheap representation of the serial devices of the system, when it
+    changes the ports must be enumerated again
+
+    Returns:
+        tuple -- (name, inode, change time) of each device
+    """
+    if(platform() == 'windows'):
+        return windows_signature()
+
+    try:
+        names = os.listdir('/dev')
+    except OSError:
+        return None
+
+    devices = []
+    for name in sorted(names):
+        if(not name.startswith(tuple(DEV_NAMES))):
+            continue
+
+        try:
+            stat = os.stat(os.path.join('/dev', name))
+        except OSError:
+            continue
+
+        devices.append((name, stat.st_ino, stat.st_ctime))
+
+    return tuple(devices)
+
+
+def renewed_ports(old, new):
+    """Renewed ports
+
+    Devices that exist in both signatures, but were created again (the
+    name is the same, the inode or the change time are not)
+
+    Arguments:
+        old {tuple} -- previous signature
+        new {tuple} -- current signature
+
+    Returns:
+        set -- port names ex. {'/dev/ttyUSB0'}
+    """
+    if(not old or not new or platform() == 'windows'):
+        return set()
+
+    old = dict((device[0], device[1:]) for device in old)
+
+    return set(os.path.join('/dev', device[0]) for device in new
+               if device[0] in old and old[device[0]] != device[1:])
+
+
+def windows_signature():
+    """Windows Signature
+
+    The serial ports available are listed in HARDWARE\\DEVICEMAP\\SERIALCOMM
+
+    Returns:
+        tuple -- (device, port) pairs, None if the key can't be read
+    """
+    try:
+        import winreg
+    except ImportError:
+        return None
+
+    values = []
+
+    try:
+        key = winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE,
+                             'HARDWARE\\DEVICEMAP\\SERIALCOMM')
+    except OSError:
+        # the key doesn't exist when there aren't ports
+        return ()
+
+    try:
+        index = 0
+        while(True):
+            name, value, kind = winreg.EnumValue(key, index)
+            values.append((name, value))
+            index += 1
+    except OSError:
+        pass
+    finally:
+        winreg.CloseKey(key)
+
+    return tuple(sorted(values))
+
+
+def enumerate_ports():
+    """Enumerate Ports
+
+    Full (and slow) enumeration of the serial ports
+
+    Returns:
+        list -- [description, hwid, port] of each port
+    """
+    ports = list(list_ports.comports())
+    windows = platform() == 'windows'
+    serial_ports = []
+
+    for port_no, description, address in ports:
+        for dev_name in DEV_NAMES:
+            if(address != 'n/a' and dev_name in port_no or windows):
+                serial_ports.append([description, address, port_no])
+                break
+
+    return serial_ports
+
+
+class PortRegistry(object):
+    """
+    Serial ports of the system, enumerated only when they change
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._ports = []
+        self._signature = None
+        self._enumerated = False
+        self._subscribers = []
+        self._intervals = {}
+        self._thread = None
+        self._wake = threading.Event()
+
+    def ports(self):
+        """Ports
+
+        List of the serial ports, the cached list is returned unless the
+        devices have changed
+
+        Returns:
+            list -- [description, hwid, port] of each port
+        """
+        self.refresh()
+
+        with self._lock:
+            return [list(port) for port in self._ports]
+
+    def port_names(self):
+        """Port Names
+
+        Returns:
+            list -- name of each port ex. ['COM1', '/dev/ttyUSB0']
+        """
+        return [port[2] for port in self.ports()]
+
+    def refresh(self, force=False):
+        """Refresh
+
+        Enumerates the ports if the signature of the devices changed (or
+        it can't be computed) and notifies the subscribers about the
+        ports added and removed
+
+        Keyword Arguments:
+            force {bool} -- enumerate even if nothing changed (default: {False})
+
+        Returns:
+            bool -- True if the ports were enumerated
+        """
+        with self._refresh_lock:
+            signature = devices_signature()
+
+            changed = (force or not self._enumerated or signature is None or
+                       signature != self._signature)
+            if(not changed):
+                return False
+
+            ports = enumerate_ports()
+            renewed = renewed_ports(self._signature, signature)
+
+            with self._lock:
+                old = set(port[2] for port in self._ports)
+                new = set(port[2] for port in ports)
+
+                self._ports = ports
+                self._signature = signature
+                self._enumerated = True
+                subscribers = list(self._subscribers)
+
+            renewed &= old & new
+            events = [(REMOVED, port) for port in sorted((old - new) | renewed)]
+            events.extend((ADDED, port) for port in sorted((new - old) | renewed))
+
+        # the lock is released first, the subscribers can list the ports
+        for event, port in events:
+            for callback in subscribers:
+                callback(event, port)
+
+        return True
+
+    def subscribe(self, callback, interval=POLL_INTERVAL):
+        """Subscribe
+
+        Calls the callback when a port is added or removed. The callback
+        is called from the thread that detected the change (usually the
+        polling thread)
+
+        Arguments:
+            callback {function} -- callback(event, port) event can
+                                   be ADDED or REMOVED
+
+        Keyword Arguments:
+            interval {float} -- seconds between each check of the devices
+                                while the callback is subscribed, the
+                                shortest of all is used (default: {POLL_INTERVAL})
+        """
+        self.refresh()
+
+        with self._lock:
+            if(callback not in self._subscribers):
+                self._subscribers.append(callback)
+            self._intervals[callback] = interval
+
+            # the polling thread can be waiting a longer interval
+            self._wake.set()
+            if(self._thread is None):
+                self._thread = threading.Thread(target=self.poll)
+                self._thread.daemon = True
+                self._thread.start()
+
+    def unsubscribe(self, callback):
+        """Unsubscribe
+
+        Removes the callback, the polling thread ends when there are
+        no more subscribers
+
+        Arguments:
+            callback {function} -- callback given in subscribe
+        """
+        with self._lock:
+            if(callback in self._subscribers):
+                self._subscribers.remove(callback)
+                self._intervals.pop(callback, None)
+
+            if(not self._subscribers):
+                self._wake.set()
+
+    def poll(self):
+        """
+        Checks the devices until there are no more subscribers
+        """
+        interval = POLL_INTERVAL
+
+        while(True):
+            self._wake.wait(interval)
+
+            with self._lock:
+                if(not self._subscribers):
+                    self._thread = None
+                    return
+
+                self._wake.clear()
+                interval = min(self._intervals.values())
+
+            try:
+                self.refresh()
+            except Exception:
+                pass
+
+
+# single registry for the whole plugin
+port_registry = PortRegistry()
@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Single thread that reads all the serial monitors open.
+
+Instead of a thread blocked in each port, the open ports are registered
+in the reactor, one thread waits in select() for any of them to have data
+and dispatches the bytes received to the monitor owner of the port (which
+keeps its own decoder/formatter). Ports can be added and removed at any
+time, a pipe is used to wake up the select when the list changes.
+
+select() on Windows only works with sockets, there the thread checks the
+input buffer of each port every POLL_INTERVAL seconds.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from __future__ import unicode_literals
+
+import os
+import time
+import select
+import threading
+import traceback
+
+from sublime import platform
+
+# max bytes read from a port in each dispatch
+READ_SIZE = 2 ** 12
+# seconds between each check of the ports when select can't be used
+POLL_INTERVAL = 0.02
+
+
+class SerialReactor(object):
+    """
+    Owns the serial ports open and dispatches the data received
+
+    The monitors registered must have the attributes/methods:
+        serial {Serial} -- pyserial object already open
+        on_data(data) -- called with the bytes received
+        on_error() -- called when the port fails (unplugged board, etc)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._monitors = []
+        self._closing = []
+        self._thread = None
+        self._use_select = platform() != 'windows'
+        self._wake_r = None
+        self._wake_w = None
+
+        if(self._use_select):
+            import fcntl
+
+            self._wake_r, self._wake_w = os.pipe()
+            fcntl.fcntl(self._wake_w, fcntl.F_SETFL, os.O_NONBLOCK)
+
+    def add(self, monitor):
+        """Add port
+
+        Starts to read the port of the given monitor, the serial port
+        must be open
+
+        Arguments:
+            monitor {SerialMonitor} -- monitor owner of the port
+        """
+        monitor.serial.timeout = 0
+
+        with self._lock:
+            if(monitor not in self._monitors):
+                self._monitors.append(monitor)
+
+            if(self._thread is None):
+                self._thread = threading.Thread(target=self.run)
+                self._thread.daemon = True
+                self._thread.start()
+
+        self.wake_up()
+
+    def remove(self, monitor):
+        """Remove port
+
+        Stops to read the port of the given monitor, the port is closed
+        by the reactor thread, so it's never closed in the middle of a read
+
+        Arguments:
+            monitor {SerialMonitor} -- monitor owner of the port
+        """
+        with self._lock:
+            if(monitor not in self._monitors):
+                return
+
+            self._monitors.remove(monitor)
+            self._closing.append(monitor.serial)
+
+        self.wake_up()
+
+    def ports(self):
+        """Ports
+
+        Returns:
+            list -- name of the ports been read
+        """
+        with self._lock:
+            return [monitor.serial.port for monitor in self._monitors]
+
+    def wake_up(self):
+        """
+        Interrupts the select to reload the list of ports
+        """
+        if(self._use_select):
+            try:
+                os.write(self._wake_w, b'x')
+            except OSError:
+                # the pipe is full, the reactor is already waked up
+                pass
+
+    def run(self):
+        """Reactor loop
+
+        Waits for data in any of the ports and dispatches it. The thread
+        ends when there are no more ports to read
+        """
+        try:
+            self.loop()
+        finally:
+            # if the loop failed, the next port added starts a new thread
+            with self._lock:
+                if(self._thread is threading.current_thread()):
+                    self._thread = None
+
+    def loop(self):
+        while(True):
+            with self._lock:
+                closing = self._closing
+                self._closing = []
+                monitors = list(self._monitors)
+
+                if(not monitors and not closing):
+                    self._thread = None
+                    return
+
+            for serial in closing:
+                self.close(serial)
+
+            if(not monitors):
+                continue
+
+            if(self._use_select):
+                ready = self.wait_select(monitors)
+            else:
+                ready = self.wait_poll(monitors)
+
+            for monitor in ready:
+                # it could be removed while waiting
+                if(monitor in self._monitors):
+                    self.dispatch(monitor)
+
+    def wait_select(self, monitors):
+        """Wait select
+
+        Blocks until one or more ports have data or the reactor is waked up
+
+        Arguments:
+            monitors {list} -- monitors to wait
+
+        Returns:
+            list -- monitors with data available
+        """
+        fds = {}
+        for monitor in monitors:
+            try:
+                fds[monitor.serial.fileno()] = monitor
+            except Exception:
+                self.fail(monitor)
+
+        try:
+            ready, _, _ = select.select([self._wake_r] + list(fds), [], [])
+        except (OSError, ValueError, select.error):
+            # a port was closed while waiting, the list will be reloaded
+            return []
+
+        if(self._wake_r in ready):
+            os.read(self._wake_r, 1024)
+
+        return [fds[fd] for fd in ready if fd in fds]
+
+    def wait_poll(self, monitors):
+        """Wait poll
+
+        Checks the input buffer of each port, when no one has data it
+        sleeps POLL_INTERVAL seconds
+
+        Arguments:
+            monitors {list} -- monitors to check
+
+        Returns:
+            list -- monitors with data available
+        """
+        ready = []
+        for monitor in monitors:
+            try:
+                if(monitor.serial.inWaiting()):
+                    ready.append(monitor)
+            except Exception:
+                self.fail(monitor)
+
+        if(not ready):
+            time.sleep(POLL_INTERVAL)
+
+        return ready
+
+    def dispatch(self, monitor):
+        """Dispatch
+
+        Reads the data available in the port of the monitor (up to
+        READ_SIZE bytes, so a busy port doesn't starve the others) and
+        sends it to the monitor. If the monitor fails handling the data
+        (capture, file transfer, plotter...) only that monitor is stopped
+
+        Arguments:
+            monitor {SerialMonitor} -- monitor with data available
+        """
+        try:
+            size = min(max(monitor.serial.inWaiting(), 1), READ_SIZE)
+            data = monitor.serial.read(size)
+        except Exception:
+            self.fail(monitor)
+            return
+
+        if(not data):
+            return
+
+        try:
+            monitor.on_data(data)
+        except Exception:
+            traceback.print_exc()
+            self.fail(monitor)
+
+    def fail(self, monitor):
+        """Port failure
+
+        Removes the monitor and notifies the error to it
+
+        Arguments:
+            monitor {SerialMonitor} -- monitor of the broken port
+        """
+        self.remove(monitor)
+
+        try:
+            monitor.on_error()
+        except Exception:
+            traceback.print_exc()
+
+    def close(self, serial):
+        try:
+            serial.close()
+        except Exception:
+            pass
+
+
+# single reactor shared by all the serial monitors
+reactor = SerialReactor()
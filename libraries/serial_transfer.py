@@ -0,0 +1,335 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Sends files to a device through an open serial monitor.
+
+The file is streamed in chunks (it's never loaded entirely), with an
+optional pause between chunks and hardware (RTS/CTS) or software
+(XON/XOFF) flow control. It can also be sent with the XMODEM (128 bytes
+blocks), XMODEM-1K or YMODEM (1K blocks with the name and size of the
+file) protocols, using CRC-16 when the receiver asks for it.
+
+While a transfer is running, the data received by the monitor is sent
+to the transfer (ACK, NAK, etc) instead of to the console.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from __future__ import unicode_literals
+
+import os
+import time
+import threading
+
+from binascii import crc_hqx
+
+RAW = 'Raw'
+XMODEM = 'XMODEM'
+XMODEM_1K = 'XMODEM-1K'
+YMODEM = 'YMODEM'
+PROTOCOLS = [RAW, XMODEM, XMODEM_1K, YMODEM]
+
+SOH = b'\x01'
+STX = b'\x02'
+EOT = b'\x04'
+ACK = b'\x06'
+NAK = b'\x15'
+CAN = b'\x18'
+CRC = b'C'
+PAD = b'\x1A'
+
+# seconds waiting the receiver to start the transfer
+START_TIMEOUT = 60
+# seconds waiting the answer to a block
+BLOCK_TIMEOUT = 10
+# times a block is sent before abort
+MAX_RETRIES = 10
+# seconds between progress reports
+PROGRESS_INTERVAL = 1.0
+
+
+class TransferError(Exception):
+    pass
+
+
+class FileTransfer(object):
+    """
+    Sends a file over a serial monitor running
+    """
+
+    def __init__(self, monitor, file_path, protocol=RAW, chunk_size=256,
+                 pacing=0, flow_control='none'):
+        self.monitor = monitor
+        self.serial = monitor.serial
+        self.file_path = file_path
+        self.protocol = protocol
+        self.chunk_size = max(1, int(chunk_size))
+        self.pacing = max(0, pacing) / 1000.0
+        self.flow_control = flow_control
+        self.dprint = monitor.dprint
+
+        self.size = os.path.getsize(file_path)
+        self.sent = 0
+        self.start_time = None
+        self.last_report = 0
+        self.cancelled = False
+        self.thread = None
+
+        self._received = bytearray()
+        self._cond = threading.Condition()
+
+    def start(self):
+        """Start
+
+        Sends the file in a new thread
+        """
+        self.thread = threading.Thread(target=self.run)
+        self.thread.start()
+
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def run(self):
+        """Run
+
+        Sends the file and reports the result in the monitor console
+        """
+        name = os.path.basename(self.file_path)
+        self.dprint('transfer_start_{0}{1}{2}', name, self.size, self.protocol)
+
+        rtscts, xonxoff = self.serial.rtscts, self.serial.xonxoff
+        # only the protocols wait for the answers of the device, in raw
+        # mode the output keeps being printed in the monitor
+        if(self.protocol != RAW):
+            self.monitor.receiver = self.on_data
+        self.start_time = time.time()
+
+        try:
+            self.serial.rtscts = self.flow_control == 'rtscts'
+            self.serial.xonxoff = self.flow_control == 'xonxoff'
+
+            with open(self.file_path, 'rb') as file:
+                if(self.protocol == RAW):
+                    self.send_raw(file)
+                else:
+                    self.send_xmodem(file, name)
+        except (TransferError, IOError, OSError) as error:
+            self.dprint('transfer_error_{0}', error)
+        else:
+            elapsed = max(time.time() - self.start_time, 0.001)
+            speed = self.sent / elapsed / 1024
+            self.dprint('transfer_done_{0}{1}{2}', self.sent, round(elapsed, 2), round(speed, 2))
+        finally:
+            self.monitor.receiver = None
+            try:
+                self.serial.rtscts, self.serial.xonxoff = rtscts, xonxoff
+            except Exception:
+                pass
+
+    def cancel(self):
+        self.cancelled = True
+        with self._cond:
+            self._cond.notify_all()
+
+    def on_data(self, data):
+        """Data received
+
+        Called by the monitor with the data received while the transfer
+        is running
+
+        Arguments:
+            data {bytes} -- data received
+        """
+        with self._cond:
+            self._received.extend(data)
+            self._cond.notify_all()
+
+    def read_byte(self, timeout):
+        """Read byte
+
+        Waits for the next byte received
+
+        Arguments:
+            timeout {float} -- seconds to wait
+
+        Returns:
+            bytes -- byte received, empty if the time is over
+        """
+        end = time.time() + timeout
+
+        with self._cond:
+            while(not self._received and not self.cancelled):
+                left = end - time.time()
+                if(left <= 0):
+                    return b''
+                self._cond.wait(left)
+
+            if(self.cancelled):
+                raise TransferError('cancelled')
+
+            byte = bytes(self._received[:1])
+            del self._received[:1]
+
+            return byte
+
+    def purge(self):
+        with self._cond:
+            del self._received[:]
+
+    def progress(self, size):
+        """Progress
+
+        Counts the bytes sent and prints the progress and the speed at
+        most every PROGRESS_INTERVAL seconds
+
+        Arguments:
+            size {int} -- bytes sent
+        """
+        self.sent += size
+        now = time.time()
+
+        if(now - self.last_report < PROGRESS_INTERVAL and self.sent < self.size):
+            return
+
+        self.last_report = now
+        percent = self.sent * 100 // self.size if self.size else 100
+        speed = self.sent / max(now - self.start_time, 0.001) / 1024
+
+        self.dprint('transfer_progress_{0}{1}{2}', percent, self.sent, round(speed, 2))
+
+    def send_raw(self, file):
+        """Raw
+
+        Writes the file in chunks of chunk_size bytes
+
+        Arguments:
+            file {file} -- file open in binary mode
+        """
+        buffer = bytearray(self.chunk_size)
+        view = memoryview(buffer)
+
+        while(not self.cancelled):
+            size = file.readinto(buffer)
+            if(not size):
+                break
+
+            self.serial.write(view[:size])
+            self.progress(size)
+
+            if(self.pacing):
+                time.sleep(self.pacing)
+
+        if(self.cancelled):
+            raise TransferError('cancelled')
+
+        self.serial.flush()
+
+    def send_xmodem(self, file, name):
+        """XMODEM/YMODEM
+
+        Sends the file in blocks, each block must be acknowledged by
+        the receiver
+
+        Arguments:
+            file {file} -- file open in binary mode
+            name {str} -- file name (YMODEM header)
+        """
+        block_size = 128 if self.protocol == XMODEM else 1024
+        use_crc = self.wait_start()
+
+        if(self.protocol == YMODEM):
+            header = name.encode('utf-8') + b'\x00' + str(self.size).encode('ascii')
+            header_size = 128 if len(header) < 128 else 1024
+            self.send_block(0, header, header_size, use_crc)
+            use_crc = self.wait_start()
+
+        number = 1
+        while(True):
+            data = file.read(block_size)
+            if(not data):
+                break
+
+            self.send_block(number, data, block_size, use_crc)
+            self.progress(len(data))
+
+            number = (number + 1) % 256
+            if(self.pacing):
+                time.sleep(self.pacing)
+
+        self.send_eot()
+
+        if(self.protocol == YMODEM):
+            # empty header to end the batch
+            use_crc = self.wait_start()
+            self.send_block(0, b'', 128, use_crc)
+
+    def wait_start(self):
+        """Wait start
+
+        Waits for the receiver to ask the first block, 'C' for CRC-16
+        or NAK for checksum
+
+        Returns:
+            bool -- True if the CRC must be used
+        """
+        end = time.time() + START_TIMEOUT
+
+        while(time.time() < end):
+            byte = self.read_byte(end - time.time())
+            if(byte == CRC):
+                return True
+            if(byte == NAK):
+                return False
+            if(byte == CAN):
+                raise TransferError('cancelled by the receiver')
+
+        raise TransferError('the receiver is not ready')
+
+    def send_block(self, number, data, block_size, use_crc):
+        """Send block
+
+        Sends a block until it's acknowledged
+
+        Arguments:
+            number {int} -- block number
+            data {bytes} -- data of the block
+            block_size {int} -- 128 or 1024
+            use_crc {bool} -- CRC-16 or checksum
+        """
+        padding = b'\x00' if number == 0 else PAD
+        data = data.ljust(block_size, padding)
+
+        if(use_crc):
+            check = crc_hqx(data, 0).to_bytes(2, 'big')
+        else:
+            check = bytes([sum(data) & 0xFF])
+
+        start = SOH if block_size == 128 else STX
+        packet = start + bytes([number, 255 - number]) + data + check
+
+        for retry in range(MAX_RETRIES):
+            self.purge()
+            self.serial.write(packet)
+
+            answer = self.read_byte(BLOCK_TIMEOUT)
+            if(answer == ACK):
+                return
+            if(answer == CAN):
+                raise TransferError('cancelled by the receiver')
+
+        raise TransferError('too many retries in the block {0}'.format(number))
+
+    def send_eot(self):
+        """
+        Ends the transfer, the EOT is sent until it's acknowledged
+        """
+        for retry in range(MAX_RETRIES):
+            self.purge()
+            self.serial.write(EOT)
+
+            if(self.read_byte(BLOCK_TIMEOUT) == ACK):
+                return
+
+        raise TransferError('end of transfer not acknowledged')
@@ -0,0 +1,277 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Remembers the state of the project in the last successful build.
+
+After each successful build the hash of the project taken before the
+build started is stored by environment: the content of the source files (src_dir, include, lib and
+lib_extra_dirs), the platformio.ini file (without the upload_* options,
+they don't change the firmware) and the versions of the platforms and
+packages installed. When the hash hasn't changed, the upload can use the
+'nobuild' target and skip the SCons dependency scan.
+
+The digest of each file is cached with its size and modification time,
+so only the files changed since the last check are read again.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from __future__ import unicode_literals
+
+import os
+import re
+import json
+import hashlib
+import threading
+
+from glob import glob
+
+from ..libraries.paths import getCacheDir
+from ..libraries.readconfig import ReadConfig
+from .build_matrix import firmware_size
+
+CACHE_FILE = 'build_cache.json'
+
+# folders never included in the hash (build output, vcs)
+SKIP_FOLDERS = ['.pio', '.pioenvs', '.git', '.svn', '.hg', '.vscode']
+
+# options of platformio.ini that don't change the firmware
+UPLOAD_OPTION_RE = re.compile(r'^\s*upload_\w+\s*=.*$', re.MULTILINE)
+
+_lock = threading.Lock()
+_cache = None
+
+
+def load_cache():
+    """Load cache
+
+    Reads the hashes stored (only the first time)
+
+    Returns:
+        dict -- {'builds': {...}, 'files': {...}}
+    """
+    global _cache
+
+    if(_cache is None):
+        path = os.path.join(getCacheDir(), CACHE_FILE)
+        try:
+            with open(path, 'r') as file:
+                _cache = json.load(file)
+        except (IOError, OSError, ValueError):
+            _cache = {}
+
+        _cache.setdefault('builds', {})
+        _cache.setdefault('files', {})
+
+    return _cache
+
+
+def save_cache():
+    path = os.path.join(getCacheDir(), CACHE_FILE)
+
+    try:
+        with open(path, 'w') as file:
+            json.dump(_cache, file)
+    except (IOError, OSError):
+        pass
+
+
+def source_folders(project_path, ini_path, env):
+    """Source folders
+
+    Folders with files that are part of the firmware
+
+    Arguments:
+        project_path {str} -- folder where platformio runs
+        ini_path {str} -- platformio.ini path
+        env {str} -- environment name
+
+    Returns:
+        list -- folder paths
+    """
+    folders = [os.path.join(project_path, folder)
+               for folder in ('src', 'include', 'lib', '.piolibdeps')]
+
+    config = ReadConfig()
+    config.read(ini_path)
+
+    for section, option in (('platformio', 'src_dir'),
+                            ('platformio', 'include_dir'),
+                            ('platformio', 'lib_dir'),
+                            ('platformio', 'lib_extra_dirs'),
+                            ('env:' + env, 'lib_extra_dirs')):
+        if(not config.has_option(section, option)):
+            continue
+
+        for value in config.get(section, option) or []:
+            for folder in value.split(','):
+                folder = os.path.expanduser(folder.strip())
+                if(folder):
+                    folders.append(os.path.join(project_path, folder))
+
+    return sorted(set(folder for folder in folders if os.path.isdir(folder)))
+
+
+def file_digest(file_path, stat, files_cache):
+    """File digest
+
+    md5 of the file content, it's read only when the size or the
+    modification time changed since the last time
+
+    Arguments:
+        file_path {str} -- path of the file
+        stat {stat_result} -- os.stat of the file
+        files_cache {dict} -- path: [size, mtime, digest]
+
+    Returns:
+        str -- hex digest
+    """
+    cached = files_cache.get(file_path)
+    if(cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime):
+        return cached[2]
+
+    md5 = hashlib.md5()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(2 ** 16), b''):
+            md5.update(block)
+
+    digest = md5.hexdigest()
+    files_cache[file_path] = [stat.st_size, stat.st_mtime, digest]
+
+    return digest
+
+
+def toolchain_files():
+    """Toolchain files
+
+    Manifest of the platforms and packages installed, they include the
+    version of each one
+
+    Returns:
+        list -- manifest paths
+    """
+    pio_home = os.path.join(os.path.expanduser('~'), '.platformio')
+
+    files = glob(os.path.join(pio_home, 'platforms', '*', 'platform.json'))
+    files.extend(glob(os.path.join(pio_home, 'packages', '*', 'package.json')))
+
+    return sorted(files)
+
+
+def project_hash(project_path, ini_path, env):
+    """Project hash
+
+    Hash of everything that can change the firmware of the environment
+
+    Arguments:
+        project_path {str} -- folder where platformio runs
+        ini_path {str} -- platformio.ini path
+        env {str} -- environment name
+
+    Returns:
+        str -- hex digest
+    """
+    files_cache = load_cache()['files']
+    md5 = hashlib.md5()
+
+    md5.update(env.encode('utf-8'))
+
+    with open(ini_path, 'rb') as file:
+        ini = file.read().decode('utf-8', 'replace')
+    md5.update(UPLOAD_OPTION_RE.sub('', ini).encode('utf-8'))
+
+    for folder in source_folders(project_path, ini_path, env):
+        for root, dirs, files in os.walk(folder):
+            dirs[:] = sorted(d for d in dirs if d not in SKIP_FOLDERS)
+
+            for name in sorted(files):
+                file_path = os.path.join(root, name)
+                try:
+                    stat = os.stat(file_path)
+                    digest = file_digest(file_path, stat, files_cache)
+                except (IOError, OSError):
+                    continue
+
+                md5.update(file_path.encode('utf-8', 'replace'))
+                md5.update(digest.encode('ascii'))
+
+    for file_path in toolchain_files():
+        try:
+            stat = os.stat(file_path)
+            md5.update(file_digest(file_path, stat, files_cache).encode('ascii'))
+        except (IOError, OSError):
+            continue
+
+    return md5.hexdigest()
+
+
+def build_key(project_path, env):
+    return '{0}|{1}'.format(os.path.normcase(os.path.abspath(project_path)), env)
+
+
+def current_hash(project_path, ini_path, env):
+    """Current hash
+
+    Hash of the project in its current state, it must be taken before
+    the build starts, a file saved while the build is running must not
+    be considered as built
+
+    Arguments:
+        project_path {str} -- folder where platformio runs
+        ini_path {str} -- platformio.ini path
+        env {str} -- environment name
+
+    Returns:
+        str -- hex digest, None if the project can't be read
+    """
+    with _lock:
+        try:
+            digest = project_hash(project_path, ini_path, env)
+        except (IOError, OSError):
+            return None
+
+        # the digests of the files read are kept for the next time
+        save_cache()
+
+    return digest
+
+
+def record_build(project_path, env, digest):
+    """Record build
+
+    Stores the hash taken before a successful build
+
+    Arguments:
+        project_path {str} -- folder where platformio runs
+        env {str} -- environment name
+        digest {str} -- hash returned by current_hash before the build
+    """
+    if(not digest):
+        return
+
+    with _lock:
+        load_cache()['builds'][build_key(project_path, env)] = digest
+        save_cache()
+
+
+def is_up_to_date(project_path, env, digest):
+    """Up to date
+
+    Checks if the firmware of the environment was built with the
+    project in the state given by the hash
+
+    Arguments:
+        project_path {str} -- folder where platformio runs
+        env {str} -- environment name
+        digest {str} -- hash returned by current_hash
+
+    Returns:
+        bool -- True if the firmware can be uploaded without build
+    """
+    if(not digest or firmware_size(project_path, env) is None):
+        return False
+
+    with _lock:
+        return load_cache()['builds'].get(build_key(project_path, env)) == digest
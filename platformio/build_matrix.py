@@ -0,0 +1,277 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Builds all the environments of a project at the same time.
+
+Each environment is compiled in its own PlatformIO process, a bounded pool
+of workers (one per CPU by default) takes the environments from a queue.
+The output of each process is split in lines and printed with the name of
+its environment as prefix, so the outputs don't get mixed in the console.
+When all the builds end, a summary table with the result of each one is
+printed.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from __future__ import unicode_literals
+
+import os
+import time
+import threading
+
+from codecs import getincrementaldecoder
+from collections import deque
+from multiprocessing import cpu_count
+
+from ..libraries.tools import prepare_command, get_setting
+from .command import AsyncProcess, STDOUT, STDERR
+from .scheduler import scheduler, PRIORITY_COMPILE
+
+# build folders used by the differents PlatformIO versions
+BUILD_FOLDERS = ['.pioenvs', os.path.join('.pio', 'build')]
+FIRMWARE_FILES = ['firmware.bin', 'firmware.hex', 'firmware.elf']
+
+
+def pool_size(jobs, setting='build_jobs', default=None):
+    """Pool Size
+
+    Number of builds to run at the same time, it's taken from the
+    'build_jobs' setting or the number of CPUs of the system
+
+    Arguments:
+        jobs {int} -- number of environments to build
+
+    Keyword Arguments:
+        setting {str} -- option with the number of workers (default: {'build_jobs'})
+        default {int} -- workers when the option isn't set, the number
+                         of CPUs when it's None (default: {None})
+
+    Returns:
+        int -- number of workers
+    """
+    if(default is None):
+        try:
+            default = cpu_count()
+        except NotImplementedError:
+            default = 1
+
+    workers = get_setting(setting, None) or default
+    return max(1, min(int(workers), jobs))
+
+
+def firmware_size(project_path, env):
+    """Firmware Size
+
+    Searches the firmware generated for the given environment
+
+    Arguments:
+        project_path {str} -- folder with the platformio.ini file
+        env {str} -- environment name
+
+    Returns:
+        int/None -- size in bytes, None if the firmware wasn't found
+    """
+    for folder in BUILD_FOLDERS:
+        for firmware in FIRMWARE_FILES:
+            file_path = os.path.join(project_path, folder, env, firmware)
+            if(os.path.exists(file_path)):
+                return os.path.getsize(file_path)
+    return None
+
+
+class EnvironmentBuild(object):
+    """
+    Compiles one environment and prints its output line by line
+    """
+
+    def __init__(self, env, cwd, dprint, verbose=False):
+        self.env = env
+        self.cwd = cwd
+        self.dprint = dprint
+        self.decoders = dict((stream, getincrementaldecoder('utf-8')('replace'))
+                             for stream in (STDOUT, STDERR))
+        self.verbose = verbose
+        self.prefix = '[{0}] '.format(env)
+        self.partial = {STDOUT: '', STDERR: ''}
+        self.lock = threading.Lock()
+        self.proc = None
+        self.exit_code = None
+        self.duration = None
+        self.size = None
+
+    def command(self):
+        """
+        PlatformIO options used to build the environment
+        """
+        return ['run', '-e', self.env]
+
+    def run(self):
+        """Run build
+
+        Starts the PlatformIO process and waits until it finishes
+        """
+        cmd = prepare_command(self.command(), self.verbose)
+
+        try:
+            self.proc = AsyncProcess(cmd, self, cwd=self.cwd)
+        except Exception:
+            self.exit_code = -1
+            return
+
+        self.proc.wait()
+
+    def kill(self):
+        if(self.proc):
+            self.proc.kill()
+
+    def _on_data(self, data, stream=STDOUT):
+        with self.lock:
+            characters = self.decoders[stream].decode(data)
+            characters = characters.replace('\r\n', '\n').replace('\r', '\n')
+            characters = self.partial[stream] + characters
+
+            lines = characters.split('\n')
+            self.partial[stream] = lines.pop()
+
+        if(lines):
+            text = ''.join(self.prefix + line + '\n' for line in lines)
+            self.dprint(text)
+
+    def _on_finished(self, proc):
+        for stream, partial in self.partial.items():
+            if(partial):
+                self.dprint(self.prefix + partial + '\n')
+                self.partial[stream] = ''
+
+        self.exit_code = proc.exit_code()
+        self.duration = time.time() - proc.start_time
+
+        # a failed build can leave the firmware of the previous one
+        if(self.exit_code == 0):
+            self.size = firmware_size(self.cwd, self.env)
+
+
+class BuildMatrix(object):
+    """
+    Builds a list of environments with a bounded pool of workers
+    """
+
+    def __init__(self, envs, cwd, messages):
+        self.envs = envs
+        self.cwd = cwd
+        self.dprint = messages.print
+        self.dprint_raw = messages.print_raw
+        self.builds = []
+        self.cancelled = False
+        self._pending = deque()
+        self._lock = threading.Lock()
+
+    def run(self):
+        """Run matrix
+
+        Waits for its turn in the command scheduler and builds all the
+        environments. Blocks until all the builds have finished
+
+        Returns:
+            list -- EnvironmentBuild objects, None if it was cancelled
+        """
+        verbose = get_setting('verbose_output', False)
+        cmd = ['run'] + ['-e ' + env for env in self.envs]
+
+        job, is_new = scheduler.submit(cmd, self.cwd, PRIORITY_COMPILE)
+        if(not is_new):
+            job.wait()
+            return None
+
+        job.process = self
+        if(not scheduler.acquire(job)):
+            return None
+
+        try:
+            self.builds = [EnvironmentBuild(env, self.cwd, self.dprint_raw, verbose)
+                           for env in self.envs]
+            self._pending.extend(self.builds)
+
+            workers = pool_size(len(self.builds))
+            self.dprint('build_all_{0}{1}', len(self.builds), workers)
+
+            threads = []
+            for n in range(workers):
+                thread = threading.Thread(target=self.worker)
+                thread.start()
+                threads.append(thread)
+
+            for thread in threads:
+                thread.join()
+
+            self.print_summary()
+        finally:
+            scheduler.release(job)
+
+        return self.builds
+
+    def worker(self):
+        """Worker
+
+        Takes the next pending environment and builds it, until there
+        is nothing left in the queue
+        """
+        while(not self.cancelled):
+            with self._lock:
+                if(not self._pending):
+                    return
+                build = self._pending.popleft()
+
+            build.run()
+
+    def kill(self):
+        """Kill builds
+
+        Called by the scheduler when the job is cancelled, stops the
+        running builds and discards the pending ones
+        """
+        self.cancelled = True
+
+        with self._lock:
+            self._pending.clear()
+
+        for build in self.builds:
+            build.kill()
+
+    def print_summary(self):
+        """Summary
+
+        Prints a table with the exit code, duration and firmware size
+        of each environment
+        """
+        width = max([len(build.env) for build in self.builds] + [11]) + 2
+
+        header = '{0}{1}{2}{3}{4}\n'.format('Environment'.ljust(width),
+                                           'Status'.ljust(10),
+                                           'Exit'.ljust(6),
+                                           'Duration'.ljust(10),
+                                           'Firmware')
+        rows = ['\n', header, '-' * (len(header) + 6) + '\n']
+
+        for build in self.builds:
+            if(build.exit_code is None):
+                status = 'SKIPPED'
+            elif(build.exit_code == 0):
+                status = 'SUCCESS'
+            else:
+                status = 'FAILED'
+
+            exit_code = '-' if build.exit_code is None else str(build.exit_code)
+            duration = '-' if build.duration is None else '{0:.1f}s'.format(build.duration)
+            size = '-' if build.size is None else '{0:.1f} KB'.format(build.size / 1024)
+
+            rows.append('{0}{1}{2}{3}{4}\n'.format(build.env.ljust(width),
+                                                  status.ljust(10),
+                                                  exit_code.ljust(6),
+                                                  duration.ljust(10),
+                                                  size))
+
+        self.dprint('build_all_summary')
+        self.dprint_raw(''.join(rows))
@@ -24,28 +24,42 @@
 
 import os
 import time
-import html
 import threading
+import subprocess
 import sublime
 
-from re import findall, search
 from sys import platform
+from select import select
 from subprocess import Popen, PIPE
+from codecs import getincrementaldecoder
 from functools import partial
-from collections import deque
 
 from ..libraries import messages
 from ..libraries.tools import prepare_command, get_setting, get_sysetting
 from ..libraries.thread_progress import ThreadProgress
 from .project_recognition import ProjectRecognition
+from .scheduler import scheduler
+from .diagnostics import DiagnosticParser, NOTE
+from .phantoms import get_inline_phantoms
 
-_COMMAND_QUEUE = deque()
-_BUSY = False
+# max bytes read from a pipe at once
+READ_SIZE = 2 ** 15
 
+# identity of the pipe given to the listener with each chunk
+STDOUT = 'stdout'
+STDERR = 'stderr'
 
-class AsyncProcess(object):
 
-    def __init__(self, cmd, listener):
+class AsyncProcess(object):
+    """
+    Runs a shell command and sends its output to the listener as soon as
+    it's available. stdout and stderr are drained from a single thread
+    multiplexing both pipes, so a chatty stream can't fill its pipe and
+    stop the process while the other one is being read. Each chunk is
+    sent with the name of the pipe it was read from.
+    """
+
+    def __init__(self, cmd, listener, cwd=None):
         self.listener = listener
         self.killed = False
         self.start_time = time.time()
@@ -55,18 +69,12 @@ class AsyncProcess(object):
             stdout=PIPE,
             stderr=PIPE,
             stdin=PIPE,
+            cwd=cwd,
             shell=True)
 
-        if(self.proc.stdout):
-            th1 = threading.Thread(target=self.read_stdout)
-            th1.start()
-            th1.join()
-            ThreadProgress(th1, '', '')
-
-        if(self.proc.stderr):
-            th2 = threading.Thread(target=self.read_stderr)
-            th2.start()
-            th2.join()
+        self.thread = threading.Thread(target=self.read_pipes)
+        self.thread.start()
+        ThreadProgress(self.thread, '', '')
 
     def kill(self):
         """Kill process
@@ -93,58 +101,141 @@ class AsyncProcess(object):
         """
         return self.proc.poll()
 
-    def read_stdout(self):
-        """Read stdout output
+    def wait(self, timeout=None):
+        """Wait process
 
-        Reads the stdout outputs when the data is available
-        and send it to the listener to be printed
+        Blocks the caller until all the output has been delivered
+        to the listener and the process has finished
+
+        Keyword Arguments:
+            timeout {float} -- seconds to wait (default: {None})
+
+        Returns:
+            bool -- True if the process finished
         """
-        while True:
-            data = os.read(self.proc.stdout.fileno(), 2 ** 15)
+        self.thread.join(timeout)
+        return not self.thread.is_alive()
 
-            if(len(data) > 0):
-                if(self.listener):
-                    self.listener._on_data(data)
-            else:
-                self.proc.stdout.close()
-                if(self.listener):
-                    time.sleep(0.01)
-                    self.listener._on_finished(self)
-                break
+    def read_pipes(self):
+        """Read outputs
+
+        Reads stdout and stderr when there is data available in any
+        of them and send it to the listener to be printed. When both
+        pipes are closed the listener is notified.
+        """
+        pipes = [(stream, pipe) for stream, pipe in
+                 ((STDOUT, self.proc.stdout), (STDERR, self.proc.stderr)) if pipe]
 
-    def read_stderr(self):
-        """Read stderr output
+        if(platform == 'win32'):
+            # pipes can't be used with select in windows
+            self.read_pipes_blocking(pipes)
+        else:
+            self.read_pipes_select(pipes)
+
+        self.proc.wait()
+
+        if(self.listener):
+            self.listener._on_finished(self)
 
-        Reads the stderr outputs when the data is available
-        and send it to the listener to be printed
+    def read_pipes_select(self, pipes):
+        """Multiplexed read
+
+        Waits with select until one of the pipes is readable and reads
+        at most READ_SIZE bytes from it, until all the pipes reach EOF
+
+        Arguments:
+            pipes {list} -- (stream, file object) of each pipe to read
+        """
+        pipes = dict((pipe.fileno(), (stream, pipe)) for stream, pipe in pipes)
+
+        while(pipes):
+            try:
+                readable = select(list(pipes), [], [])[0]
+            except InterruptedError:
+                continue
+
+            for fileno in readable:
+                data = os.read(fileno, READ_SIZE)
+
+                if(data):
+                    self.send_data(data, pipes[fileno][0])
+                else:
+                    pipes.pop(fileno)[1].close()
+
+    def read_pipes_blocking(self, pipes):
+        """Blocking read
+
+        Fallback for the platforms where pipes can't be polled, the
+        last pipe is read in the current thread and the rest of them
+        in a helper thread each one
+
+        Arguments:
+            pipes {list} -- (stream, file object) of each pipe to read
+        """
+        helpers = []
+        for stream, pipe in pipes[1:]:
+            helper = threading.Thread(target=self.read_pipe, args=(pipe, stream))
+            helper.start()
+            helpers.append(helper)
+
+        if(pipes):
+            self.read_pipe(pipes[0][1], pipes[0][0])
+
+        for helper in helpers:
+            helper.join()
+
+    def read_pipe(self, pipe, stream):
+        """Read pipe
+
+        Reads the given pipe until EOF
+
+        Arguments:
+            pipe {obj} -- file object to read
+            stream {str} -- STDOUT or STDERR
         """
         while True:
-            data = os.read(self.proc.stderr.fileno(), 2 ** 15)
+            data = os.read(pipe.fileno(), READ_SIZE)
 
-            if len(data) > 0:
-                if self.listener:
-                    self.listener._on_data(data)
-            else:
-                self.proc.stderr.close()
+            if(not data):
+                pipe.close()
                 break
 
+            self.send_data(data, stream)
+
+    def send_data(self, data, stream):
+        """Send data
+
+        Sends the output chunk to the listener (if there is one). In
+        windows each pipe is read in its own thread, so the listener can
+        be called from two threads at the same time
+
+        Arguments:
+            data {bytes} -- output read from the process
+            stream {str} -- STDOUT or STDERR
+        """
+        listener = self.listener
+        if(listener):
+            listener._on_data(data, stream)
+
 
 class Command(ProjectRecognition):
     _txt = None
 
     errors_inline = None
-    errs_by_file = {}
-    phantom_sets_by_buffer = {}
 
     def __init__(self):
         super(Command, self).__init__()
         self._output = None
+        self.proc = None
+        self.job = None
+        self.cwd = None
 
     def init(self, extra_name=None, messages=None):
         self._extra_name = extra_name
         self._txt = messages
 
-    def run_command(self, cmd, kill=False, word_wrap=True, in_file=False):
+    def run_command(self, cmd, kill=False, word_wrap=True, in_file=False,
+                    priority=None):
         self.window = sublime.active_window()
 
         # sets environment
@@ -152,20 +243,49 @@ class Command(ProjectRecognition):
         if(env_path):
             os.environ['PATH'] = env_path
 
-        global _COMMAND_QUEUE
-        global _BUSY
-
         # kill the process
         if(kill):
-            if(self.proc):
+            if(self.job):
+                scheduler.cancel(self.job.id)
+                self.job = None
+            elif(self.proc):
                 self.proc.kill()
-                self.proc = None
+            self.proc = None
             return
 
-        if(_BUSY):
-            _COMMAND_QUEUE.append(cmd)
+        # wait for the turn of this command
+        job, is_new = scheduler.submit(cmd, self.cwd, priority)
+        self.job = job
+
+        if(not is_new):
+            # an identical command was already in the queue
+            job.wait()
+            if(job.owner):
+                self._output = job.owner.get_output()
+            return
+
+        job.owner = self
+
+        if(not scheduler.acquire(job)):
             return
 
+        try:
+            self.execute(cmd, in_file)
+        finally:
+            scheduler.release(job)
+
+    def execute(self, cmd, in_file=False):
+        """Execute command
+
+        Runs the platformio command and waits until it finishes. It must
+        be called only when the scheduler gave the turn to the command
+
+        Arguments:
+            cmd {list} -- platformio command options
+
+        Keyword Arguments:
+            in_file {bool} -- print the output in a new view (default: {False})
+        """
         if(not self._txt):
             try:
                 self._txt = messages.Messages(self._extra_name)
@@ -174,7 +294,21 @@ class Command(ProjectRecognition):
                 pass
 
         self.encoding = 'utf-8'
+        # a character split between two chunks is kept by the decoder
+        # of its own pipe
+        self.decoders = dict((stream, getincrementaldecoder(self.encoding)('replace'))
+                             for stream in (STDOUT, STDERR))
         self.proc = None
+        self.data_lock = threading.Lock()
+        # a line of one pipe can't be completed with the text of the other
+        self.diagnostics = dict((stream, DiagnosticParser(self.add_diagnostic))
+                                for stream in (STDOUT, STDERR))
+
+        # errors inline, removes the ones from the previous build
+        self.errors_inline = get_setting('show_errors_inline', True)
+        if(self.errors_inline):
+            self.phantoms = get_inline_phantoms(self.window)
+            sublime.set_timeout(self.phantoms.clear, 0)
 
         verbose = get_setting('verbose_output', False)
         cmd = prepare_command(cmd, verbose)
@@ -183,10 +317,14 @@ class Command(ProjectRecognition):
             os.chdir(self.cwd)
 
         try:
-            _BUSY = True
             self.proc = AsyncProcess(cmd, self)
         except Exception as e:
-            pass
+            return
+
+        self.job.process = self.proc
+
+        # callers expect the output to be ready when this method returns
+        self.proc.wait()
 
     def exit_code(self):
         return self.proc.exit_code()
@@ -194,11 +332,13 @@ class Command(ProjectRecognition):
     def get_output(self):
         return self._output
 
-    def _on_data(self, data):
-        try:
-            characters = data.decode(self.encoding)
-        except:
-            characters = "[Decode error - output not " + self.encoding + "]\n"
+    def _on_data(self, data, stream=STDOUT):
+        with self.data_lock:
+            self.process_data(data, stream)
+
+    def process_data(self, data, stream):
+        # a character can be split between two chunks
+        characters = self.decoders[stream].decode(data)
 
         # if there is not printer, store the data
         if(not self._txt):
@@ -211,22 +351,30 @@ class Command(ProjectRecognition):
         # Normalize newlines, Sublime Text always uses a single \n separator
         # in memory.
         characters = characters.replace('\r\n', '\n').replace('\r', '\n')
-        self._txt.print(characters)
+        self._txt.print_raw(characters)
 
         if(self.errors_inline):
-            # errors inline
-            errors = self.find_all_pio_errors(characters)
-            for file, line, column, text in errors:
-                if file not in self.errs_by_file:
-                    self.errs_by_file[file] = []
-                self.errs_by_file[file].append((line, column, text))
+            self.diagnostics[stream].feed(characters)
+
+    def add_diagnostic(self, diagnostic):
+        """Add diagnostic
+
+        Stores the errors and warnings found in the output, to be
+        shown inline. Notes are not displayed
+
+        Arguments:
+            diagnostic {Diagnostic} -- record given by the DiagnosticParser
+        """
+        if(diagnostic.severity == NOTE):
+            return
 
-            self.update_phantoms()
+        self.phantoms.add(diagnostic.file, diagnostic.line, diagnostic.column,
+                          diagnostic.severity, diagnostic.message)
 
     def _finish(self, proc):
         exit_code = proc.exit_code()
 
-        if(exit_code == 0 and not len(_COMMAND_QUEUE)):
+        if(exit_code == 0 and not scheduler.queue_depth()):
             sublime.status_message("Build finished")
         else:
             sublime.status_message("Build finished with errors")
@@ -234,129 +382,9 @@ class Command(ProjectRecognition):
         end_time = time.strftime('%c')
         self._txt.print("\n[{0}]", end_time)
 
-        # run next command in the deque
-        run_next()
-
     def _on_finished(self, proc):
-        sublime.set_timeout(partial(self._finish, proc), 0)
-
-    def find_all_pio_errors(self, text):
-        """Find PlatformIO errors
-        
-        Extract all errors gived by PlatformIO
-        
-        Arguments:
-            text {str} -- line string with error
-        
-        Returns:
-            [tuple] -- (file_path, line_number, colum_number, error_text)
-        """
-        error = []
-
-        # substract error with regex
-        if('error:' in text):
-            result = search("(.+):([0-9]+):([0-9]+):\s(.+)", text)
-            if(result is not None):
-                file_path = result.group(1)
-                line_number = result.group(2)
-                column_number = result.group(3)
-                error_txt = result.group(4)
-
-                error.append([file_path, int(line_number), int(column_number), error_txt])
-
-        return error
-
-    def update_phantoms(self):
-        stylesheet = '''
-            <style>
-                div.content {
-                    padding: 0.45rem 0.45rem 0.45rem 0.45rem;
-                    margin: 0.2rem 0;
-                    border-radius: 4px;
-                }
-                div.content span.message {
-                    color: white;
-                    padding-right: 0.4rem;
-                    padding-left: 0.5rem;
-                }
-                span.error_box {
-                    padding: 5px;
-                    color: white;
-                    font-weight: bold;
-                    border-radius: 3px;
-                    background-color: red;
-                }
-                span.warning_box {
-                    padding: 5px;
-                    color: white;
-                    font-weight: bold;
-                    border-radius: 3px;
-                    background-color: #d1cd00;
-                }
-                div.content a {
-                    text-decoration: inherit;
-                    padding: 0.35rem 0.7rem 0.45rem 0.8rem;
-                    position: relative;
-                    bottom: 0.05rem;
-                    border-radius: 4px;
-                    font-weight: bold;
-                }
-                html.dark div.content a {
-                    background-color: #00000018;
-                }
-                html.light div.content a {
-                    background-color: #ffffff18;
-                }
-            </style>
-        '''
-
-        for file, errs in self.errs_by_file.items():
-            view = self.window.find_open_file(file)
-            if view:
-
-                buffer_id = view.buffer_id()
-                if buffer_id not in self.phantom_sets_by_buffer:
-                    phantom_set = sublime.PhantomSet(view, "exec")
-                    self.phantom_sets_by_buffer[buffer_id] = phantom_set
-                else:
-                    phantom_set = self.phantom_sets_by_buffer[buffer_id]
-
-                phantoms = []
-
-                for line, column, text in errs:
-                    pt = view.text_point(line - 1, column - 1)
-                    phantoms.append(sublime.Phantom(
-                        sublime.Region(pt, view.line(pt).b),
-                        ('<body id=inline-error>' + stylesheet +
-                            '<div class="content">'
-                            '<span class="error_box">error</span>' + 
-                            '<span class="message">' + html.escape(text, quote=False) + '</span>' +
-                            '<a href=hide>' + chr(0x00D7) + '</a></div>' +
-                            '</div></body>'),
-                        sublime.LAYOUT_BELOW,
-                        on_navigate=self.on_phantom_navigate))
-
-                phantom_set.update(phantoms)
-
-    def hide_phantoms(self):
-        for file, errs in self.errs_by_file.items():
-            view = self.window.find_open_file(file)
-            if view:
-                view.erase_phantoms("exec")
-
-        self.errs_by_file = {}
-        self.phantom_sets_by_buffer = {}
-        self.show_errors_inline = False
-
-    def on_phantom_navigate(self, url):
-        self.hide_phantoms()
-
-
-def run_next():
-    global _COMMAND_QUEUE
-    global _BUSY
-
-    _BUSY = False
+        if(self.errors_inline):
+            for diagnostics in self.diagnostics.values():
+                diagnostics.flush()
 
-    if(len(_COMMAND_QUEUE)):
-        Command().run_command(_COMMAND_QUEUE.popleft())
\ No newline at end of file
+        sublime.set_timeout(partial(self._finish, proc), 0)
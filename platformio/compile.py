@@ -13,9 +13,10 @@ from ..libraries.tools import save_sysetting
 from ..libraries.thread_progress import ThreadProgress
 
 class Compile(Initialize):
-    def __init__(self):
+    def __init__(self, all_envs=False):
         super(Compile, self).__init__()
 
+        self.all_envs = all_envs
         self.nonblock_compile()
 
     def start_compilation(self):
@@ -27,6 +28,10 @@ class Compile(Initialize):
         if(not self.check_main_requirements()):
             exit(0)
 
+        if(self.all_envs):
+            self.compile_all_envs()
+            return
+
         save_sysetting('last_action', self.COMPILE)
         
         self.add_board()
@@ -34,16 +39,62 @@ class Compile(Initialize):
             self.print("select_board_list")
             return
 
-        self.add_option('lib_extra_dirs')
+        self.add_option('lib_extra_dirs', append=True)
 
         # add src_dir option if it's neccesary
         self.override_src()
 
+        # hash of the sources before the build starts
+        digest = self.build_digest()
+
         cmd = ['run', '-e ', self.board_id]
         self.run_command(cmd)
 
+        if(self.proc and self.proc.exit_code() == 0):
+            self.record_build(digest)
+
         self.after_complete()
 
+    def compile_all_envs(self):
+        """Compile all environments
+        
+        Builds all the environments initialized in platformio.ini at
+        the same time, if there is none environment initialized it
+        will compile only the selected one
+        """
+        from os import path
+        from .build_matrix import BuildMatrix
+
+        envs = self.get_envs_initialized()
+        if(not envs):
+            self.all_envs = False
+            self.start_compilation()
+            return
+
+        for env in envs:
+            self.board_id = env
+            self.add_option('lib_extra_dirs', append=True)
+
+        self.override_src()
+
+        # hashes of the sources before the builds start
+        digests = {}
+        for env in envs:
+            self.board_id = env
+            digests[env] = self.build_digest()
+
+        project_path = path.dirname(self.get_ini_path())
+        builds = BuildMatrix(envs, project_path, self._txt).run() or []
+
+        for build in builds:
+            if(build.exit_code == 0):
+                self.board_id = build.env
+                self.record_build(digests[build.env])
+
+        for env in envs:
+            self.board_id = env
+            self.after_complete()
+
     def nonblock_compile(self):
         """New Thread Execution
         
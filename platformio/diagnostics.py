@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Incremental parser for the GCC/Clang diagnostics in the build output.
+
+The output of the build process arrives in chunks of any size, a line can
+be split between two chunks. LineAssembler keeps the incomplete tail of the
+last chunk and only returns complete lines, so each line is parsed once,
+and DiagnosticParser classifies those lines as error, warning or note.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from __future__ import unicode_literals
+
+import re
+from collections import namedtuple
+
+ERROR = 'error'
+WARNING = 'warning'
+NOTE = 'note'
+
+# path:line:column: severity: message (column is optional)
+DIAGNOSTIC_RE = re.compile(
+    r'^(?P<file>.+?):(?P<line>\d+):(?:(?P<column>\d+):)?\s*'
+    r'(?P<severity>fatal error|error|warning|note):\s*(?P<message>.*)$')
+
+# cheap test to discard lines before run the regex
+MARKERS = ('error:', 'warning:', 'note:')
+
+# longest incomplete line kept between chunks
+MAX_PARTIAL = 2 ** 16
+
+Diagnostic = namedtuple('Diagnostic',
+                        ['file', 'line', 'column', 'severity', 'message'])
+
+
+class LineAssembler(object):
+    """
+    Joins the chunks of a stream and returns only complete lines
+    """
+
+    def __init__(self):
+        self.partial = ''
+
+    def feed(self, text):
+        """Feed text
+
+        Adds a new chunk of text to the stream
+
+        Arguments:
+            text {str} -- chunk with newlines normalized to '\\n'
+
+        Returns:
+            list -- complete lines (without the newline)
+        """
+        lines = text.split('\n')
+
+        if(self.partial):
+            lines[0] = self.partial + lines[0]
+
+        self.partial = lines.pop()
+
+        # a line this long isn't a diagnostic, don't keep growing it
+        if(len(self.partial) > MAX_PARTIAL):
+            self.partial = ''
+
+        return lines
+
+    def flush(self):
+        """Flush
+
+        Returns the incomplete line stored (if any) and resets the buffer
+
+        Returns:
+            list -- the last line or an empty list
+        """
+        partial = self.partial
+        self.partial = ''
+        return [partial] if partial else []
+
+
+class DiagnosticParser(object):
+    """
+    Extracts diagnostic records from the build output as it arrives
+    """
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.assembler = LineAssembler()
+        self.counters = {ERROR: 0, WARNING: 0, NOTE: 0}
+
+    def feed(self, text):
+        """Feed text
+
+        Parses the complete lines available after add the given chunk
+
+        Arguments:
+            text {str} -- chunk of the build output
+
+        Returns:
+            list -- Diagnostic records found in the chunk
+        """
+        return self.parse_lines(self.assembler.feed(text))
+
+    def flush(self):
+        """Flush
+
+        Parses the last line when the stream is finished
+
+        Returns:
+            list -- Diagnostic records found
+        """
+        return self.parse_lines(self.assembler.flush())
+
+    def parse_lines(self, lines):
+        """Parse lines
+
+        Arguments:
+            lines {list} -- complete lines
+
+        Returns:
+            list -- Diagnostic records found
+        """
+        diagnostics = []
+
+        for line in lines:
+            diagnostic = parse_line(line)
+            if(diagnostic is None):
+                continue
+
+            self.counters[diagnostic.severity] += 1
+            diagnostics.append(diagnostic)
+
+            if(self.callback):
+                self.callback(diagnostic)
+
+        return diagnostics
+
+
+def parse_line(line):
+    """Parse line
+
+    Converts a line with a GCC/Clang diagnostic in a Diagnostic record
+
+    Arguments:
+        line {str} -- line of the build output
+
+    Returns:
+        Diagnostic/None -- None if the line isn't a diagnostic
+    """
+    for marker in MARKERS:
+        if(marker in line):
+            break
+    else:
+        return None
+
+    result = DIAGNOSTIC_RE.match(line)
+    if(result is None):
+        return None
+
+    severity = result.group('severity')
+    if(severity == 'fatal error'):
+        severity = ERROR
+
+    column = result.group('column')
+    column = int(column) if column else 1
+
+    return Diagnostic(result.group('file'), int(result.group('line')),
+                      column, severity, result.group('message'))
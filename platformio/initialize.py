@@ -74,6 +74,56 @@ class Initialize(ProjectCheck):
         thread = Thread(target=self.add_board)
         thread.start()
 
+    def build_digest(self):
+        """Build digest
+
+        Hash of the sources, platformio.ini and toolchain of the selected
+        environment. It must be taken before the build starts
+
+        Returns:
+            str -- hex digest, None if it can't be calculated
+        """
+        from os import path
+        from .build_cache import current_hash
+
+        ini_path = self.get_ini_path()
+        return current_hash(path.dirname(ini_path), ini_path, self.board_id)
+
+    def record_build(self, digest):
+        """Record build
+
+        Stores the hash taken before the last successful build of the
+        selected environment
+
+        Arguments:
+            digest {str} -- hash returned by build_digest
+        """
+        from os import path
+        from .build_cache import record_build
+
+        record_build(path.dirname(self.get_ini_path()), self.board_id, digest)
+
+    def is_built(self, digest):
+        """Firmware up to date
+
+        Checks if the firmware of the selected environment was built
+        with the sources, platformio.ini and toolchain of the hash
+
+        Arguments:
+            digest {str} -- hash returned by build_digest
+
+        Returns:
+            bool -- True if the build can be skipped
+        """
+        from os import path
+        from .build_cache import is_up_to_date
+
+        if(not get_setting('upload_nobuild', True)):
+            return False
+
+        project_path = path.dirname(self.get_ini_path())
+        return is_up_to_date(project_path, self.board_id, digest)
+
     def after_complete(self):
         """At complete
         
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Uploads the same firmware to several devices at the same time.
+
+The environment is compiled only once, then each device (serial port or
+mDNS/OTA address) is flashed in its own PlatformIO process with the
+'nobuild' target, so the firmware already built is reused. A bounded
+pool of workers (the 'upload_jobs' option) takes the devices from a
+queue, a failed upload is retried 'upload_retries' times and a summary
+with the result of each device is printed at the end.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from __future__ import unicode_literals
+
+import threading
+
+from collections import deque
+
+from ..libraries.tools import get_setting
+from .build_matrix import EnvironmentBuild, pool_size
+from .scheduler import scheduler, PRIORITY_UPLOAD
+
+# devices flashed at the same time when 'upload_jobs' isn't set
+UPLOAD_JOBS = 4
+
+
+class DeviceUpload(EnvironmentBuild):
+    """
+    Uploads the firmware already built to one device, the output is
+    printed with the port as prefix
+    """
+
+    def __init__(self, port, env, cwd, dprint, verbose=False):
+        super(DeviceUpload, self).__init__(env, cwd, dprint, verbose)
+        self.port = port
+        self.prefix = '[{0}] '.format(port)
+        self.attempts = 0
+        self.total_time = 0.0
+
+    def command(self):
+        return ['run', '-e', self.env, '-t', 'nobuild', '-t', 'upload',
+                '--upload-port', self.port]
+
+
+class MultiUpload(object):
+    """
+    Builds an environment and uploads it to a list of devices with a
+    bounded pool of workers
+    """
+
+    def __init__(self, ports, env, cwd, messages, build=True):
+        self.ports = ports
+        self.env = env
+        self.cwd = cwd
+        self.build = build
+        self.dprint = messages.print
+        self.dprint_raw = messages.print_raw
+        self.uploads = []
+        self.cancelled = False
+        self.current = []
+        self._pending = deque()
+        self._lock = threading.Lock()
+
+    def run(self):
+        """Run uploads
+
+        Waits for its turn in the command scheduler, builds the firmware
+        (unless it's already up to date) and uploads it to all the
+        devices. Blocks until all the uploads have finished
+
+        Returns:
+            list -- DeviceUpload objects, None if it was cancelled or
+                    the build failed
+        """
+        verbose = get_setting('verbose_output', False)
+        cmd = ['run', '-t', 'upload', '-e', self.env] + list(self.ports)
+
+        job, is_new = scheduler.submit(cmd, self.cwd, PRIORITY_UPLOAD)
+        if(not is_new):
+            job.wait()
+            return None
+
+        job.process = self
+        if(not scheduler.acquire(job)):
+            return None
+
+        try:
+            if(self.build):
+                build = EnvironmentBuild(self.env, self.cwd, self.dprint_raw, verbose)
+                self.current = [build]
+                build.run()
+
+                if(build.exit_code != 0 or self.cancelled):
+                    self.dprint('upload_all_build_failed')
+                    return None
+
+            self.uploads = [DeviceUpload(port, self.env, self.cwd, self.dprint_raw, verbose)
+                            for port in self.ports]
+            self.current = self.uploads
+            self._pending.extend(self.uploads)
+
+            workers = pool_size(len(self.uploads), 'upload_jobs', UPLOAD_JOBS)
+            self.dprint('upload_all_{0}{1}', len(self.uploads), workers)
+
+            threads = []
+            for n in range(workers):
+                thread = threading.Thread(target=self.worker)
+                thread.start()
+                threads.append(thread)
+
+            for thread in threads:
+                thread.join()
+
+            self.print_summary()
+        finally:
+            scheduler.release(job)
+
+        return self.uploads
+
+    def worker(self):
+        """Worker
+
+        Takes the next pending device and uploads the firmware to it,
+        retrying when the upload fails, until the queue is empty
+        """
+        retries = max(0, int(get_setting('upload_retries', 1) or 0))
+
+        while(not self.cancelled):
+            with self._lock:
+                if(not self._pending):
+                    return
+                upload = self._pending.popleft()
+
+            for attempt in range(retries + 1):
+                if(attempt):
+                    self.dprint('upload_retry_{0}{1}', upload.port, attempt)
+
+                upload.attempts += 1
+                upload.run()
+                upload.total_time += upload.duration or 0.0
+
+                if(upload.exit_code == 0 or self.cancelled):
+                    break
+
+    def kill(self):
+        """Kill uploads
+
+        Called by the scheduler when the job is cancelled, stops the
+        running processes and discards the pending devices
+        """
+        self.cancelled = True
+
+        with self._lock:
+            self._pending.clear()
+
+        for process in self.current:
+            process.kill()
+
+    def print_summary(self):
+        """Summary
+
+        Prints a table with the result, attempts and time of each device
+        """
+        width = max([len(upload.port) for upload in self.uploads] + [6]) + 2
+
+        header = '{0}{1}{2}{3}\n'.format('Device'.ljust(width),
+                                        'Status'.ljust(10),
+                                        'Attempts'.ljust(10),
+                                        'Duration')
+        rows = ['\n', header, '-' * (len(header) + 6) + '\n']
+        failed = 0
+
+        for upload in self.uploads:
+            if(upload.exit_code is None):
+                status = 'SKIPPED'
+            elif(upload.exit_code == 0):
+                status = 'SUCCESS'
+            else:
+                status = 'FAILED'
+
+            if(upload.exit_code != 0):
+                failed += 1
+
+            duration = '{0:.1f}s'.format(upload.total_time) if upload.attempts else '-'
+
+            rows.append('{0}{1}{2}{3}\n'.format(upload.port.ljust(width),
+                                               status.ljust(10),
+                                               str(upload.attempts).ljust(10),
+                                               duration))
+
+        self.dprint('upload_all_summary_{0}{1}', len(self.uploads) - failed, failed)
+        self.dprint_raw(''.join(rows))
@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Inline diagnostics (errors and warnings) shown as phantoms in the views.
+
+The diagnostics found in the build output are stored by file and rendered
+in batches, at most once per UI frame. Only the buffers with new
+diagnostics are updated, and the phantoms already rendered are reused, so
+each diagnostic is converted to HTML only once.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from __future__ import unicode_literals
+
+import html
+import threading
+import sublime
+
+# time between renders (milliseconds)
+FRAME_TIME = 16
+
+STYLESHEET = '''
+    <style>
+        div.content {
+            padding: 0.45rem 0.45rem 0.45rem 0.45rem;
+            margin: 0.2rem 0;
+            border-radius: 4px;
+        }
+        div.content span.message {
+            color: white;
+            padding-right: 0.4rem;
+            padding-left: 0.5rem;
+        }
+        span.error_box {
+            padding: 5px;
+            color: white;
+            font-weight: bold;
+            border-radius: 3px;
+            background-color: red;
+        }
+        span.warning_box {
+            padding: 5px;
+            color: white;
+            font-weight: bold;
+            border-radius: 3px;
+            background-color: #d1cd00;
+        }
+        div.content a {
+            text-decoration: inherit;
+            padding: 0.35rem 0.7rem 0.45rem 0.8rem;
+            position: relative;
+            bottom: 0.05rem;
+            border-radius: 4px;
+            font-weight: bold;
+        }
+        html.dark div.content a {
+            background-color: #00000018;
+        }
+        html.light div.content a {
+            background-color: #ffffff18;
+        }
+    </style>
+'''
+
+# the stylesheet is joined only once, not for each phantom
+HTML_HEAD = '<body id=inline-error>' + STYLESHEET + '<div class="content">'
+HTML_TAIL = '<a href=hide>' + chr(0x00D7) + '</a></div></body>'
+
+_inline_phantoms = {}
+
+
+def get_inline_phantoms(window):
+    """Inline Phantoms
+
+    Gets the InlinePhantoms object of the given window, it's created
+    the first time
+
+    Arguments:
+        window {obj} -- ST window
+
+    Returns:
+        InlinePhantoms -- phantoms of the window
+    """
+    window_id = window.id()
+
+    if(window_id not in _inline_phantoms):
+        _inline_phantoms[window_id] = InlinePhantoms(window)
+
+    return _inline_phantoms[window_id]
+
+
+class InlinePhantoms(object):
+    """
+    Errors and warnings of a build displayed under the line where
+    they occur
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.lock = threading.Lock()
+        self.errs_by_file = {}
+        self.dirty = set()
+        self.scheduled = False
+        self.phantom_sets_by_buffer = {}
+        self.phantoms_by_buffer = {}
+
+    def add(self, file, line, column, severity, text):
+        """Add diagnostic
+
+        Stores a new diagnostic and schedules a render. It can be called
+        from any thread
+
+        Arguments:
+            file {str} -- file path
+            line {int} -- line number (starting from 1)
+            column {int} -- column number (starting from 1)
+            severity {str} -- error or warning
+            text {str} -- diagnostic message
+        """
+        with self.lock:
+            if(file not in self.errs_by_file):
+                self.errs_by_file[file] = []
+
+            self.errs_by_file[file].append((line, column, severity, text))
+            self.dirty.add(file)
+
+            if(self.scheduled):
+                return
+            self.scheduled = True
+
+        sublime.set_timeout(self.render, FRAME_TIME)
+
+    def render(self):
+        """Render
+
+        Updates the phantoms of the files with new diagnostics, it must
+        run in the UI thread
+        """
+        with self.lock:
+            dirty = self.dirty
+            self.dirty = set()
+            self.scheduled = False
+
+            pending = {}
+            for file in dirty:
+                pending[file] = list(self.errs_by_file[file])
+
+        for file, errs in pending.items():
+            view = self.window.find_open_file(file)
+            if(not view):
+                continue
+
+            buffer_id = view.buffer_id()
+            if(buffer_id not in self.phantom_sets_by_buffer):
+                self.phantom_sets_by_buffer[buffer_id] = sublime.PhantomSet(view, "exec")
+                self.phantoms_by_buffer[buffer_id] = []
+
+            phantoms = self.phantoms_by_buffer[buffer_id]
+
+            # only the new diagnostics are converted in phantoms
+            for line, column, severity, text in errs[len(phantoms):]:
+                pt = view.text_point(line - 1, column - 1)
+                content = (HTML_HEAD +
+                           '<span class="' + severity + '_box">' + severity + '</span>' +
+                           '<span class="message">' + html.escape(text, quote=False) + '</span>' +
+                           HTML_TAIL)
+
+                phantoms.append(sublime.Phantom(
+                    sublime.Region(pt, view.line(pt).b),
+                    content,
+                    sublime.LAYOUT_BELOW,
+                    on_navigate=self.on_phantom_navigate))
+
+            self.phantom_sets_by_buffer[buffer_id].update(phantoms)
+
+    def clear(self):
+        """Clear
+
+        Removes all the phantoms and the stored diagnostics
+        """
+        with self.lock:
+            self.errs_by_file = {}
+            self.dirty = set()
+
+        for phantom_set in self.phantom_sets_by_buffer.values():
+            phantom_set.update([])
+
+        self.phantom_sets_by_buffer = {}
+        self.phantoms_by_buffer = {}
+
+    def on_phantom_navigate(self, url):
+        self.clear()
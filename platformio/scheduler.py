@@ -0,0 +1,330 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Scheduler for the PlatformIO commands.
+
+Only one PlatformIO command can run at the same time, the commands are
+queued as jobs and dispatched by priority (upload, compile, the rest of
+commands and library list refresh) instead of arrival order. A job
+identical to the one running or to one waiting in the queue is coalesced
+into it (five clicks on Compile make a single build), and queued or
+running jobs can be cancelled by its id.
+
+The job is run in the thread who scheduled it, the scheduler only decides
+when is its turn, so the caller keeps all its context (console, cwd, etc).
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from __future__ import unicode_literals
+
+import time
+import heapq
+import threading
+from itertools import count
+
+# lower value runs first
+PRIORITY_UPLOAD = 0
+PRIORITY_COMPILE = 1
+PRIORITY_DEFAULT = 2
+PRIORITY_LIBRARY = 3
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+CANCELLED = 'cancelled'
+
+
+def command_priority(cmd):
+    """Command Priority
+
+    Guess the priority of a PlatformIO command from its arguments
+
+    Arguments:
+        cmd {list} -- platformio command options ex. ['run', '-e', 'uno']
+
+    Returns:
+        int -- priority of the command
+    """
+    if('run' in cmd):
+        if('upload' in cmd or 'program' in cmd):
+            return PRIORITY_UPLOAD
+        return PRIORITY_COMPILE
+
+    if('lib' in cmd and 'list' in cmd):
+        return PRIORITY_LIBRARY
+
+    return PRIORITY_DEFAULT
+
+
+class Job(object):
+    """
+    Command waiting in (or dispatched by) the scheduler
+    """
+
+    def __init__(self, job_id, cmd, cwd=None, priority=PRIORITY_DEFAULT):
+        self.id = job_id
+        self.cmd = cmd
+        self.cwd = cwd
+        self.priority = priority
+        self.key = (tuple(cmd), cwd)
+        self.state = QUEUED
+        self.owner = None
+        self.process = None
+        self.coalesced = 0
+        self.queued_time = time.time()
+        self.start_time = None
+        self.end_time = None
+        self._done = threading.Event()
+
+    def wait(self, timeout=None):
+        """Wait Job
+
+        Blocks until the job is finished or cancelled
+
+        Keyword Arguments:
+            timeout {float} -- seconds to wait (default: {None})
+
+        Returns:
+            bool -- True if the job is finished
+        """
+        return self._done.wait(timeout)
+
+    def wait_time(self):
+        """Wait Time
+
+        Seconds the job has been (or was) waiting in the queue
+
+        Returns:
+            float -- seconds
+        """
+        end = self.start_time or self.end_time or time.time()
+        return end - self.queued_time
+
+
+class Scheduler(object):
+    """
+    Priority queue of PlatformIO jobs, only one of them runs at time
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._heap = []
+        self._queued = {}
+        self._running = None
+        self._ids = count(1)
+
+        # metrics
+        self.dispatched = 0
+        self.coalesced = 0
+        self.cancelled = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def submit(self, cmd, cwd=None, priority=None):
+        """Submit Job
+
+        Adds a new job to the queue. If there is an identical job (same
+        command and working directory) running, or waiting in the queue,
+        that job is returned instead. A queued job takes the highest
+        priority of both.
+
+        Arguments:
+            cmd {list} -- platformio command options
+
+        Keyword Arguments:
+            cwd {str} -- working directory of the command (default: {None})
+            priority {int} -- job priority, guessed from the command
+                              when it's None (default: {None})
+
+        Returns:
+            tuple -- (job, bool) the bool is False if the job was coalesced
+        """
+        if(priority is None):
+            priority = command_priority(cmd)
+
+        key = (tuple(cmd), cwd)
+
+        with self._cond:
+            running = self._running
+            if(running and running.state == RUNNING and running.key == key):
+                running.coalesced += 1
+                self.coalesced += 1
+                return (running, False)
+
+            for job in self._queued.values():
+                if(job.key == key):
+                    job.coalesced += 1
+                    self.coalesced += 1
+                    if(priority < job.priority):
+                        job.priority = priority
+                        self._rebuild_heap()
+                    return (job, False)
+
+            job = Job(next(self._ids), cmd, cwd, priority)
+            self._queued[job.id] = job
+            heapq.heappush(self._heap, (job.priority, job.id, job))
+            self._cond.notify_all()
+
+        return (job, True)
+
+    def acquire(self, job):
+        """Acquire Turn
+
+        Blocks until it's the turn of the given job to run
+
+        Arguments:
+            job {Job} -- job returned by submit
+
+        Returns:
+            bool -- False if the job was cancelled while waiting
+        """
+        with self._cond:
+            while(job.state == QUEUED and
+                  (self._running or self._head() is not job)):
+                self._cond.wait()
+
+            if(job.state != QUEUED):
+                return False
+
+            heapq.heappop(self._heap)
+            del self._queued[job.id]
+
+            job.state = RUNNING
+            job.start_time = time.time()
+            self._running = job
+
+            wait = job.wait_time()
+            self.dispatched += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+        return True
+
+    def release(self, job):
+        """Release Turn
+
+        Marks the job as finished and lets the next one to run
+
+        Arguments:
+            job {Job} -- job previously acquired
+        """
+        with self._cond:
+            if(job.state == RUNNING):
+                job.state = DONE
+            job.end_time = time.time()
+            if(self._running is job):
+                self._running = None
+            self._cond.notify_all()
+
+        job._done.set()
+
+    def cancel(self, job_id):
+        """Cancel Job
+
+        Removes a job from the queue, if the job is already running, its
+        process is killed
+
+        Arguments:
+            job_id {int} -- id of the job
+
+        Returns:
+            bool -- True if the job was found
+        """
+        with self._cond:
+            job = self._queued.pop(job_id, None)
+
+            if(job):
+                job.state = CANCELLED
+                job.end_time = time.time()
+                self.cancelled += 1
+                self._rebuild_heap()
+                self._cond.notify_all()
+            elif(self._running and self._running.id == job_id):
+                job = self._running
+                job.state = CANCELLED
+                self.cancelled += 1
+            else:
+                return False
+
+        if(job.start_time is None):
+            job._done.set()
+        elif(job.process):
+            job.process.kill()
+
+        return True
+
+    def cancel_all(self):
+        """Cancel All
+
+        Cancels all the jobs in the queue and the running one
+        """
+        with self._cond:
+            ids = list(self._queued.keys())
+            if(self._running):
+                ids.append(self._running.id)
+
+        for job_id in ids:
+            self.cancel(job_id)
+
+    def queue_depth(self):
+        """Queue Depth
+
+        Returns:
+            int -- number of jobs waiting to run
+        """
+        with self._cond:
+            return len(self._queued)
+
+    def running(self):
+        """Running Job
+
+        Returns:
+            Job/None -- job running, None if there is nothing running
+        """
+        return self._running
+
+    def metrics(self):
+        """Metrics
+
+        Queue depth and wait time information of the scheduler
+
+        Returns:
+            dict -- queue metrics, the times are in seconds
+        """
+        with self._cond:
+            waiting = [job.wait_time() for job in self._queued.values()]
+            dispatched = self.dispatched
+
+            return {
+                'depth': len(waiting),
+                'running': self._running.id if self._running else None,
+                'dispatched': dispatched,
+                'coalesced': self.coalesced,
+                'cancelled': self.cancelled,
+                'avg_wait': self.total_wait / dispatched if dispatched else 0.0,
+                'max_wait': self.max_wait,
+                'oldest_wait': max(waiting) if waiting else 0.0,
+            }
+
+    def _head(self):
+        """
+        First job alive in the heap, cancelled jobs are discarded
+        """
+        while(self._heap and self._heap[0][2].state != QUEUED):
+            heapq.heappop(self._heap)
+        return self._heap[0][2] if self._heap else None
+
+    def _rebuild_heap(self):
+        """
+        Rebuilds the heap after a priority change or a cancellation
+        """
+        self._heap = [(job.priority, job.id, job)
+                      for job in self._queued.values()]
+        heapq.heapify(self._heap)
+
+
+# single scheduler shared by all the PlatformIO commands
+scheduler = Scheduler()
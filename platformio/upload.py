@@ -14,9 +14,10 @@ from ..libraries.thread_progress import ThreadProgress
 from ..libraries.I18n import I18n
 
 class Upload(Initialize):
-    def __init__(self):
+    def __init__(self, ports=None):
         super(Upload, self).__init__()
 
+        self.ports = ports
         self.nonblock_upload()
 
     def start_upload(self):
@@ -28,6 +29,10 @@ class Upload(Initialize):
         if(not self.check_main_requirements()):
             exit(0)
 
+        if(self.ports):
+            self.upload_multiple()
+            return
+
         save_sysetting('last_action', self.UPLOAD)
 
         # check board selected or make select it
@@ -72,18 +77,91 @@ class Upload(Initialize):
 
         self.check_serial_monitor()
 
-        # add src_dir flag if it's neccesary
-        self.override_src()
-
-        self.run_command(cmd)
+        try:
+            # add src_dir flag if it's neccesary
+            self.override_src()
+
+            # firmware built with the same sources, skip the build
+            digest = self.build_digest()
+            built = self.is_built(digest)
+            if(built):
+                cmd[1:1] = ['-t', 'nobuild']
+                self.print('upload_nobuild')
+
+            self.run_command(cmd)
+
+            if(not built and self.proc and self.proc.exit_code() == 0):
+                self.record_build(digest)
+        finally:
+            # reattach the monitor first, to not lose the boot output. A
+            # parked monitor can't be toggled, it must be reattached even
+            # if the upload failed
+            if(get_setting('run_monitor', None)):
+                from ..libraries.serial import reattach_serial_monitor
+                reattach_serial_monitor(self.port_id)
+            save_setting('run_monitor', None)
 
         self.after_complete()
 
-        if(get_setting('run_monitor', None)):
-            from ..libraries.serial import toggle_serial_monitor
-            toggle_serial_monitor()
-        save_setting('run_monitor', None)
 
+    def upload_multiple(self):
+        """Upload to several devices
+        
+        Builds the selected environment once and uploads it to all the
+        ports in self.ports (serial ports or OTA addresses) at the same
+        time. The monitors running in those ports are parked and
+        reattached after the upload
+        """
+        from os import path
+        from re import search
+        from .multi_upload import MultiUpload
+        from ..libraries import serial
+
+        self.add_board()
+        if(not self.board_id):
+            self.print("select_board_list")
+            return
+
+        self.add_option('lib_extra_dirs', append=True)
+        self.add_option('upload_speed')
+        self.read_pio_preferences()
+
+        for port_id in self.ports:
+            self.port_id = port_id
+            ip_device = search(r"^\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}$", port_id)
+
+            if(ip_device and not self.check_auth_ota()):
+                self.print("ota_error_platform")
+                return
+
+        parked = []
+        for port_id in self.ports:
+            if(port_id in serial.serials_in_use):
+                monitor = serial.serial_monitor_dict.get(port_id, None)
+                if(monitor):
+                    monitor.park()
+                    parked.append(port_id)
+
+        try:
+            self.override_src()
+
+            # firmware built with the same sources, skip the build
+            digest = self.build_digest()
+            built = self.is_built(digest)
+            if(built):
+                self.print('upload_nobuild')
+
+            project_path = path.dirname(self.get_ini_path())
+            uploads = MultiUpload(self.ports, self.board_id, project_path,
+                                  self._txt, build=not built).run()
+
+            if(uploads is not None and not built):
+                self.record_build(digest)
+        finally:
+            for port_id in parked:
+                serial.reattach_serial_monitor(port_id)
+
+        self.after_complete()
 
     def nonblock_upload(self):
         """New Thread Execution